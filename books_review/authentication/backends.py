@@ -0,0 +1,38 @@
+from django.contrib.auth.backends import ModelBackend
+
+from . import passwords
+from .lookups import acached_user, cached_user
+from .models import User
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend resolving the session's user from the cache.
+
+    authentication.signals drop the cached user when it is saved (a password
+    change, a login), deleted or logged out, so that sessions are checked
+    against the current password hash and active flag. Async logins hash in
+    the pool of authentication.passwords.
+    """
+
+    def get_user(self, user_id):
+        user = cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        user = await acached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await User._default_manager.aget_by_natural_key(username)
+        except User.DoesNotExist:
+            # Hash anyway: unknown usernames take as long as wrong passwords
+            await passwords.amake_password(password)
+            return None
+        if await passwords.acheck_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -1,6 +1,8 @@
 from django import forms
-from django.contrib.auth import authenticate
+from django.contrib.auth import aauthenticate
 from django.contrib.auth.forms import UserCreationForm
+from . import passwords
+from .lookups import user_id_for
 from .models import User
 
 
@@ -21,16 +23,17 @@ class LoginForm(forms.Form):
         })
     )
 
-    def clean(self):
-        cleaned_data = super().clean()
-        username = cleaned_data.get('username')
-        password = cleaned_data.get('password')
+    async def aauthenticate(self, request):
+        """The user matching the valid form's credentials, or None with the form error.
 
-        if username and password:
-            user = authenticate(username=username, password=password)
-            if not user:
-                raise forms.ValidationError('Nom d\'utilisateur ou mot de passe incorrect.')
-        return cleaned_data
+        The password is hashed once, in the pool of authentication.passwords.
+        """
+        user = await aauthenticate(
+            request, username=self.cleaned_data['username'], password=self.cleaned_data['password']
+        )
+        if user is None:
+            self.add_error(None, 'Nom d\'utilisateur ou mot de passe incorrect.')
+        return user
 
 
 class SignUpForm(UserCreationForm):
@@ -67,6 +70,13 @@ class SignUpForm(UserCreationForm):
         for field_name in self.fields:
             self.fields[field_name].help_text = None
 
+    async def asave(self):
+        """save() for async views, hashing the password in the pool of authentication.passwords"""
+        user = self.instance
+        user.password = await passwords.amake_password(self.cleaned_data['password1'])
+        await user.asave()
+        return user
+
 
 class FollowUserForm(forms.Form):
     """Form to follow a user by username"""
@@ -89,12 +99,12 @@ class FollowUserForm(forms.Form):
         if not username:
             return username
             
-        try:
-            user = User.objects.get(username=username)
-        except User.DoesNotExist:
+        user_id = user_id_for(username)
+        if user_id is None:
             raise forms.ValidationError('Cet utilisateur n\'existe pas.')
         
-        if user == self.current_user:
+        if self.current_user and user_id == self.current_user.id:
             raise forms.ValidationError('Vous ne pouvez pas vous suivre vous-même.')
             
+        self.cleaned_data['user_id'] = user_id
         return username 
\ No newline at end of file
@@ -0,0 +1,47 @@
+"""Password hashers whose costs come from the settings.
+
+settings.PASSWORD_HASHER chooses the algorithm of new hashes, and the
+PASSWORD_<ALGORITHM>_* settings its costs. Django rehashes a password when
+its user logs in if the stored hash uses another algorithm or other costs,
+so raising a cost or switching algorithm upgrades the hashes as the users
+come back. Each hasher keeps the algorithm name of Django's, so existing
+hashes stay valid.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+    @property
+    def block_size(self):
+        return settings.PASSWORD_SCRYPT_BLOCK_SIZE
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_SCRYPT_PARALLELISM
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Needs argon2-cffi, installed by the argon2 extra"""
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
@@ -0,0 +1,74 @@
+"""User lookups: cached username and user lookups, invalidated by
+authentication.signals, and the request user for async views"""
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import caches
+
+from books_review.cache import aget_or_compute, get_or_compute, invalidate
+
+from .models import User
+
+LOOKUP_TIMEOUT = 60 * 60
+# Saves, deletes and QuerySet.update() drop a cached user at once; this
+# bounds how long a change made outside the ORM (raw SQL, another
+# application) goes unnoticed
+USER_TIMEOUT = 5 * 60
+
+
+def _key(username):
+    return f'user-id:{quote(username)}'
+
+
+def user_id_for(username):
+    """Id of the user with this username, or None; misses are cached too"""
+    return get_or_compute(
+        _key(username),
+        lambda: User.objects.filter(username=username).values_list('id', flat=True).first(),
+        LOOKUP_TIMEOUT,
+    )
+
+
+def forget(*usernames):
+    invalidate(*(_key(username) for username in usernames))
+
+
+def _user_key(user_id):
+    return f'user:{user_id}'
+
+
+def _fetch_user(user_id):
+    return User._default_manager.filter(pk=user_id).first()
+
+
+def _session_cache():
+    # Next to the sessions: a password change or a deactivation applies to
+    # every process at once, which the in-process tier would delay
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+def cached_user(user_id):
+    """The user with this id, or None, read through the cache"""
+    return get_or_compute(
+        _user_key(user_id), lambda: _fetch_user(user_id), USER_TIMEOUT, cache=_session_cache()
+    )
+
+
+async def acached_user(user_id):
+    return await aget_or_compute(
+        _user_key(user_id), lambda: _fetch_user(user_id), USER_TIMEOUT, cache=_session_cache()
+    )
+
+
+def forget_user(*user_ids):
+    invalidate(*[_user_key(user_id) for user_id in user_ids], cache=_session_cache())
+
+
+async def aload_user(request):
+    """Load the request's user with the async ORM and store it on request.user.
+
+    Templates reach the user through request.user (auth context processor);
+    a lazy one would query the database synchronously inside the event loop.
+    """
+    request.user = await request.auser()
+    return request.user
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:33
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counts(apps, schema_editor):
+    User = apps.get_model('authentication', 'User')
+    UserFollows = apps.get_model('reviews', 'UserFollows')
+    for column, field in (('followed_user_id', 'follower_count'), ('user_id', 'following_count')):
+        rows = UserFollows.objects.order_by().values(column).annotate(count=Count('id'))
+        for row in rows.iterator():
+            User.objects.filter(pk=row[column]).update(**{field: row['count']})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('reviews', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:49
+
+import authentication.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_follow_counts'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', authentication.models.CachedUserManager()),
+            ],
+        ),
+    ]
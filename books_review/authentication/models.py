@@ -1,10 +1,45 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 
 # Create your models here.
 
-class User(AbstractUser):
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """update() dropping the cached request users of the rows it changes (bulk_update goes through it)"""
+        return self.update_users(list(self.values_list('pk', flat=True)), **kwargs)
+
+    def update_users(self, user_ids, **kwargs):
+        """update() of a queryset known to select only user_ids, without looking them up first"""
+        updated = super().update(**kwargs)
+        # Imported here: lookups imports this module
+        from .lookups import forget_user
+        forget_user(*user_ids)
+        return updated
+
+
+class CachedUserManager(UserManager.from_queryset(UserQuerySet)):
     pass
 
+
+class User(AbstractUser):
+    # Kept up to date on every follow and unfollow by reviews.follows
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    objects = CachedUserManager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored username so a rename can invalidate cached lookups
+        if 'username' in field_names:
+            instance._loaded_username = instance.username
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # post_save receivers have seen the previous username by now
+        self._loaded_username = self.username
+
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return self.username
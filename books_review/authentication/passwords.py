@@ -0,0 +1,61 @@
+"""Password hashing for async views, in a bounded pool of threads.
+
+Hashing a password takes tens to hundreds of milliseconds of CPU. Django's
+async password checks run it in the event loop, and synchronous views all
+share one thread under ASGI: either way a burst of logins stalls the other
+requests. Here the hashes are computed by at most PASSWORD_HASHING_THREADS
+threads; further logins wait their turn. hashlib and argon2-cffi release
+the GIL while hashing, so the threads use as many cores.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASHING_THREADS, thread_name_prefix='password-hashing',
+            )
+        return _pool
+
+
+async def run(function, *args):
+    """Call function in the pool"""
+    return await asyncio.get_running_loop().run_in_executor(_executor(), partial(function, *args))
+
+
+def shutdown():
+    """Stop the pool; the next hash starts one sized by the current settings"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+async def amake_password(password):
+    """make_password() in the pool"""
+    return await run(make_password, password)
+
+
+async def acheck_password(user, password):
+    """Whether password is the user's, upgrading its hash when it is.
+
+    The new hash is computed in the pool too; only saving it touches the
+    database.
+    """
+    correct, must_update = await run(verify_password, password, user.password)
+    if correct and must_update:
+        user.password = await amake_password(password)
+        await user.asave(update_fields=['password'])
+    return correct
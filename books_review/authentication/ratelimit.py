@@ -0,0 +1,166 @@
+"""Token buckets limiting login and registration attempts.
+
+Each limit is a bucket per client IP or per username: a burst of attempts
+is allowed, then the bucket refills at a steady rate. ``rate_limited``
+views answer a POST with an empty bucket with a 429 before they read the
+form, so a credential-stuffing burst costs neither password hashes nor user
+queries. settings.RATE_LIMITS configures the buckets of each scope.
+
+Buckets live in process memory, at most MAX_BUCKETS of them (the least
+recently used go first), unless settings.RATE_LIMIT_CACHE names a cache to
+share them between processes. Cache updates are not atomic: concurrent
+attempts on one bucket from several processes may each take the same
+token, which lets a little more through than the limit.
+"""
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from functools import wraps
+from hashlib import sha256
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+MAX_BUCKETS = 100000
+REJECTED_MESSAGE = 'Trop de tentatives. Réessayez dans {seconds} secondes.'
+
+
+def take(state, now, burst, per_minute):
+    """Take a token from a bucket: (new state, 0) or, when empty, (new state, seconds to wait)"""
+    tokens, updated = state if state is not None else (burst, now)
+    tokens = min(burst, tokens + (now - updated) * per_minute / 60)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) * 60 / per_minute
+
+
+class MemoryBuckets:
+    def __init__(self, max_buckets=MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, burst, per_minute):
+        with self._lock:
+            state, wait = take(self._buckets.get(key), time.monotonic(), burst, per_minute)
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBuckets:
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def take(self, key, burst, per_minute):
+        key = f'ratelimit:{key}'
+        state, wait = take(self.cache.get(key), time.time(), burst, per_minute)
+        # Kept until the bucket would be full again
+        self.cache.set(key, state, timeout=int((burst - state[0]) * 60 / per_minute) + 1)
+        return wait
+
+
+_memory = MemoryBuckets()
+_counts = Counter()
+_counts_lock = threading.Lock()
+
+
+def _buckets():
+    if settings.RATE_LIMIT_CACHE:
+        return CacheBuckets(settings.RATE_LIMIT_CACHE)
+    return _memory
+
+
+def client_ip(request):
+    """The client address, from the header a trusted proxy sets when there is one"""
+    header = settings.RATE_LIMIT_CLIENT_IP_HEADER
+    if header:
+        forwarded = request.headers.get(header, '')
+        # The proxy appends the address it saw to any the client sent
+        if forwarded:
+            return forwarded.split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def check(scope, request):
+    """Seconds the client must wait before its next attempt on scope, 0 when it may go on"""
+    limits = settings.RATE_LIMITS[scope]
+    values = {'ip': client_ip(request), 'username': request.POST.get('username', '')}
+    buckets = _buckets()
+    wait = 0
+    for kind, (burst, per_minute) in limits.items():
+        # Hashed: usernames are chosen by the client, of any length
+        key = f'{scope}:{kind}:{sha256(values[kind].encode()).hexdigest()[:32]}'
+        wait = max(wait, buckets.take(key, burst, per_minute))
+        if wait:
+            break
+    with _counts_lock:
+        _counts[f'{scope}:{"rejected" if wait else "allowed"}'] += 1
+    return wait
+
+
+async def acheck(scope, request):
+    if settings.RATE_LIMIT_CACHE:
+        # A cache round trip, kept out of the event loop
+        return await sync_to_async(check)(scope, request)
+    return check(scope, request)
+
+
+def rejected(wait):
+    seconds = max(int(wait + 0.999), 1)
+    response = HttpResponse(
+        REJECTED_MESSAGE.format(seconds=seconds), status=429, content_type='text/plain; charset=utf-8',
+    )
+    response['Retry-After'] = str(seconds)
+    return response
+
+
+class SkipRejected(logging.Filter):
+    """Logging filter dropping django.request's warning for each rejected attempt of a burst"""
+
+    def filter(self, record):
+        return getattr(record, 'status_code', None) != 429
+
+
+def rate_limited(scope):
+    """Answer the view's POSTs with a 429 once a bucket of scope is empty"""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if request.method == 'POST':
+                    wait = await acheck(scope, request)
+                    if wait:
+                        return rejected(wait)
+                return await view(request, *args, **kwargs)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if request.method == 'POST':
+                    wait = check(scope, request)
+                    if wait:
+                        return rejected(wait)
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def stats():
+    """Allowed and rejected attempts per scope since the process started"""
+    with _counts_lock:
+        return dict(_counts)
+
+
+def reset():
+    _memory.clear()
+    with _counts_lock:
+        _counts.clear()
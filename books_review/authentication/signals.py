@@ -0,0 +1,41 @@
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import lookups
+from .usernames import index
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def forget_saved_username(sender, instance, raw=False, **kwargs):
+    """Drop the cached lookups of the username, and of the previous one on a rename"""
+    usernames = {instance.username, getattr(instance, '_loaded_username', instance.username)}
+    lookups.forget(*usernames)
+    lookups.forget_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def index_saved_username(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_loaded_username', instance.username)
+    username = instance.username
+    if created or previous != username:
+        def update():
+            if previous != username:
+                index.remove(previous)
+            index.add(username)
+        transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_username(sender, instance, **kwargs):
+    lookups.forget(instance.username)
+    lookups.forget_user(instance.pk)
+    transaction.on_commit(lambda: index.remove(instance.username))
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        lookups.forget_user(user.pk)
@@ -1,3 +1,298 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import aauthenticate
+from django.contrib.auth.hashers import verify_password
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from reviews.models import Ticket, Review, UserFollows
+from reviews.testing import QueryBudgetMixin, TestCase
+from . import ratelimit
+from .lookups import user_id_for
+from .usernames import index
+from .models import User
+
+
+class DashboardQueryBudgetTests(QueryBudgetMixin, TestCase):
+    # User (until it is cached), feed keys, tickets, reviews; the session
+    # is read from the cache
+    BUDGET = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice', password='secret-pass-123')
+
+    def publish(self, start, stop):
+        for i in range(start, stop):
+            other = User.objects.create(username=f'other{i}')
+            ticket = Ticket.objects.create(title=f'Livre {i}', user=other, image='ticket_images/cover.jpg')
+            Review.objects.create(ticket=ticket, user=self.user, rating=4, headline=f'Critique {i}')
+            Ticket.objects.create(title=f'Demande {i}', user=self.user)
+
+    def test_dashboard_query_count_does_not_grow_with_page_size(self):
+        self.client.force_login(self.user)
+        # One item, then a full page
+        for start, stop in ((0, 1), (1, 10)):
+            self.publish(start, stop)
+            with self.assertQueryBudget(self.BUDGET):
+                response = self.client.get(reverse('authentication:dashboard'))
+            self.assertContains(response, 'Critique 0')
+
+
+class UserLookupTests(TestCase):
+    def test_lookups_are_cached_and_invalidated(self):
+        self.assertIsNone(user_id_for('alice'))
+        alice = User.objects.create(username='alice')
+        self.assertEqual(user_id_for('alice'), alice.id)
+        with self.assertNumQueries(0):
+            user_id_for('alice')
+        alice.username = 'alicia'
+        alice.save()
+        self.assertIsNone(user_id_for('alice'))
+        self.assertEqual(user_id_for('alicia'), alice.id)
+        alice.delete()
+        self.assertIsNone(user_id_for('alicia'))
+
+    def test_follow_and_unfollow_by_username(self):
+        alice = User.objects.create_user(username='alice', password='secret-pass-123')
+        bob = User.objects.create(username='bob')
+        self.client.force_login(alice)
+        response = self.client.post(reverse('authentication:subscriptions'), {'username': 'bob'}, follow=True)
+        self.assertContains(response, 'Vous suivez maintenant bob!')
+        self.assertTrue(UserFollows.objects.filter(user=alice, followed_user=bob).exists())
+        response = self.client.post(reverse('authentication:subscriptions'), {'username': 'alice'})
+        self.assertContains(response, 'Vous ne pouvez pas vous suivre vous-même.')
+        response = self.client.post(reverse('authentication:unfollow', args=['bob']), follow=True)
+        self.assertContains(response, 'Vous ne suivez plus bob.')
+        self.assertEqual(self.client.post(reverse('authentication:unfollow', args=['nobody'])).status_code, 404)
+
+
+class CachedSessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username='alice', password='secret-pass-123')
+
+    def test_pages_read_neither_session_nor_user_from_the_database(self):
+        self.client.force_login(self.alice)
+        self.client.get(reverse('reviews:home'))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('reviews:home')).status_code, 200)
+        tables = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('django_session', tables)
+        self.assertNotIn('authentication_user', tables)
+
+    def test_password_change_and_deactivation_end_sessions(self):
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get(reverse('reviews:home')).status_code, 200)
+        self.alice.set_password('other-pass-456')
+        self.alice.save()
+        self.assertRedirects(
+            self.client.get(reverse('reviews:home')), f'{reverse("authentication:login")}?next=/',
+        )
+
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get(reverse('reviews:home')).status_code, 200)
+        self.alice.is_active = False
+        self.alice.save()
+        self.assertEqual(self.client.get(reverse('reviews:home')).status_code, 302)
+
+    def test_queryset_updates_drop_cached_users(self):
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get(reverse('reviews:home')).status_code, 200)
+        User.objects.filter(pk=self.alice.pk).update(is_active=False)
+        self.assertEqual(self.client.get(reverse('reviews:home')).status_code, 302)
+
+    def test_messages_do_not_write_sessions(self):
+        self.client.force_login(self.alice)
+        response = self.client.post(reverse('authentication:logout'), follow=True)
+        self.assertContains(response, 'Vous avez été déconnecté avec succès.')
+        self.assertFalse(Session.objects.exists())
+
+
+FAST_HASHERS = ['authentication.hashers.PBKDF2PasswordHasher', 'authentication.hashers.ScryptPasswordHasher']
+
+
+@override_settings(
+    PASSWORD_HASHERS=FAST_HASHERS, PASSWORD_PBKDF2_ITERATIONS=1000, PASSWORD_SCRYPT_WORK_FACTOR=2 ** 4,
+    PASSWORD_SCRYPT_PARALLELISM=1,
+)
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user(username='alice', password='secret-pass-123')
+
+    def log_in(self, password='secret-pass-123'):
+        return self.client.post(reverse('authentication:login'), {'username': 'alice', 'password': password})
+
+    def test_a_login_checks_the_password_once(self):
+        with mock.patch('authentication.passwords.verify_password', wraps=verify_password) as verify:
+            response = self.log_in('wrong-pass-123')
+            self.assertContains(response, 'Nom d&#x27;utilisateur ou mot de passe incorrect.')
+            self.assertRedirects(self.log_in(), reverse('reviews:home'), fetch_redirect_response=False)
+        self.assertEqual(verify.call_count, 2)
+
+    def test_hashes_are_upgraded_on_login(self):
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            self.log_in()
+            self.alice.refresh_from_db()
+            self.assertTrue(self.alice.password.startswith('pbkdf2_sha256$2000$'))
+        self.client.logout()
+
+        with self.settings(PASSWORD_HASHERS=FAST_HASHERS[::-1]):
+            self.log_in()
+            self.alice.refresh_from_db()
+            self.assertTrue(self.alice.password.startswith('scrypt$16$'))
+            self.assertTrue(self.alice.check_password('secret-pass-123'))
+
+    def test_register_logs_the_new_user_in(self):
+        response = self.client.post(reverse('authentication:register'), {
+            'username': 'bob', 'password1': 'bob-secret-456', 'password2': 'bob-secret-456',
+        }, follow=True)
+        self.assertContains(response, 'Compte créé avec succès pour bob!')
+        self.assertEqual(response.context['user'].username, 'bob')
+        self.assertTrue(User.objects.get(username='bob').password.startswith('pbkdf2_sha256$1000$'))
+
+
+@override_settings(
+    PASSWORD_HASHERS=FAST_HASHERS, PASSWORD_PBKDF2_ITERATIONS=1000,
+    RATE_LIMITS={'login': {'ip': (5, 6), 'username': (3, 6)}, 'register': {'ip': (2, 6)}},
+)
+class RateLimitTests(TestCase):
+    def attempt(self, username, address):
+        return self.client.post(
+            reverse('authentication:login'), {'username': username, 'password': 'wrong-pass'}, REMOTE_ADDR=address,
+        )
+
+    def test_bursts_are_rejected_before_authentication(self):
+        with mock.patch('authentication.forms.aauthenticate', wraps=aauthenticate) as authenticate:
+            statuses = [self.attempt(f'user{number}', '192.0.2.1').status_code for number in range(8)]
+            self.assertEqual(statuses, [200] * 5 + [429] * 3)
+            self.assertEqual(authenticate.call_count, 5)
+            # One username, from many addresses
+            statuses = [self.attempt('alice', f'198.18.0.{number}').status_code for number in range(5)]
+            self.assertEqual(statuses, [200] * 3 + [429] * 2)
+
+        # Bursts are not logged one warning per attempt
+        with self.assertNoLogs('django.request', 'WARNING'):
+            response = self.attempt('bob', '192.0.2.1')
+        self.assertIn(response['Retry-After'], ['9', '10'])
+        self.assertContains(response, 'Trop de tentatives', status_code=429)
+        self.assertEqual(self.attempt('bob', '192.0.2.2').status_code, 200)
+        self.assertEqual(ratelimit.stats(), {'login:allowed': 9, 'login:rejected': 6})
+        # Pages are not limited, only attempts
+        self.assertEqual(self.client.get(reverse('authentication:login'), REMOTE_ADDR='192.0.2.1').status_code, 200)
+
+    def test_buckets_refill(self):
+        state, wait = ratelimit.take(None, 100, 2, 6)
+        state, wait = ratelimit.take(state, 100, 2, 6)
+        self.assertEqual((state, wait), ((0, 100), 0))
+        self.assertEqual(ratelimit.take(state, 105, 2, 6)[1], 5)
+        self.assertEqual(ratelimit.take(state, 110, 2, 6), ((0, 110), 0))
+
+    @override_settings(RATE_LIMIT_CACHE='default')
+    def test_buckets_in_a_shared_cache(self):
+        statuses = [
+            self.client.post(reverse('authentication:register'), {'username': f'user{number}'}).status_code
+            for number in range(3)
+        ]
+        self.assertEqual(statuses, [200, 200, 429])
+
+
+class UsernameSuggestionTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user(username='alice', password='secret-pass-123')
+        for username in ['alicia', 'Albert', 'bob', 'ALINE']:
+            User.objects.create(username=username)
+        self.client.force_login(self.alice)
+
+    def suggest(self, prefix):
+        return self.client.get(reverse('authentication:username_suggestions'), {'q': prefix}).json()['usernames']
+
+    def test_prefix_matches_ignore_case(self):
+        self.assertEqual(self.suggest('AL'), ['Albert', 'alicia', 'ALINE'])
+        self.assertEqual(self.suggest('b'), ['bob'])
+        self.assertEqual(self.suggest('z'), [])
+        self.assertEqual(self.suggest(''), [])
+        self.assertEqual(index.search('al', limit=2), ['Albert', 'alice'])
+
+    def test_index_follows_users(self):
+        self.suggest('a')
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create(username='alfred')
+            bob = User.objects.get(username='bob')
+            bob.username = 'alban'
+            bob.save()
+            User.objects.filter(username='ALINE').delete()
+        self.assertEqual(self.suggest('al'), ['alban', 'Albert', 'alfred', 'alicia'])
+        self.assertEqual(self.suggest('b'), [])
+
+        # Created by another process: found by id at the next refresh
+        User.objects.bulk_create([User(username='alda')])
+        with self.settings(USERNAME_INDEX_REFRESH_SECONDS=0):
+            self.assertIn('alda', self.suggest('ald'))
+
+    def test_one_thread_refreshes_while_the_others_search(self):
+        self.suggest('a')
+        with self.settings(USERNAME_INDEX_REBUILD_SECONDS=0):
+            # As if another thread were reloading the expired index
+            with index._refresh_lock, self.assertNumQueries(0):
+                index.refresh()
+                self.assertIn('alicia', index.search('al'))
+            with self.assertNumQueries(1):
+                index.refresh()
+
+    def test_following_looks_the_user_up_once(self):
+        self.client.get(reverse('authentication:subscriptions'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('authentication:subscriptions'), {'username': 'bob'})
+        lookups = [query for query in queries.captured_queries if 'FROM "authentication_user"' in query['sql']]
+        self.assertEqual(len(lookups), 1)
+        self.assertTrue(UserFollows.objects.filter(user=self.alice, followed_user__username='bob').exists())
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username='alice', password='secret-pass-123')
+        bob = User.objects.create(username='bob')
+        UserFollows.objects.create(user=cls.alice, followed_user=bob)
+        UserFollows.objects.create(user=bob, followed_user=cls.alice)
+        Ticket.objects.create(title='Dune', user=bob)
+        Ticket.objects.create(title='Hyperion', user=cls.alice)
+
+    async def test_pages_render_under_asgi(self):
+        # The async client goes through the ASGI handler: a synchronous
+        # query in the event loop would raise SynchronousOnlyOperation
+        await self.async_client.aforce_login(self.alice)
+        response = await self.async_client.get(reverse('reviews:home'))
+        self.assertContains(response, 'Dune')
+        self.assertContains(response, 'alice')
+        response = await self.async_client.get(reverse('authentication:dashboard'))
+        self.assertContains(response, 'Hyperion')
+        self.assertNotContains(response, 'Dune')
+        response = await self.async_client.get(reverse('authentication:subscriptions'))
+        self.assertEqual([user['username'] for user in response.context['following_users']], ['bob'])
+        self.assertEqual([user['username'] for user in response.context['followers']], ['bob'])
+        self.assertContains(response, 'Abonnés (1)')
+
+    async def test_follow_list_loads_the_next_rows(self):
+        await self.async_client.aforce_login(self.alice)
+        for number in range(3):
+            await UserFollows.objects.acreate(
+                user=await User.objects.acreate(username=f'carol{number}'), followed_user=self.alice,
+            )
+        url = reverse('authentication:follow_list', args=['followers'])
+        with mock.patch('reviews.follows.PAGE_SIZE', 2):
+            response = await self.async_client.get(url)
+            self.assertContains(response, 'carol0')
+            self.assertNotContains(response, 'carol2')
+            self.assertContains(response, f'{url}?after=carol0')
+            response = await self.async_client.get(url, {'after': 'carol0'})
+            self.assertContains(response, 'carol2')
+            self.assertNotContains(response, 'data-more-url')
+        response = await self.async_client.get(reverse('authentication:follow_list', args=['everyone']))
+        self.assertEqual(response.status_code, 404)
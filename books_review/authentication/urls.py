@@ -10,5 +10,7 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('subscriptions/', views.subscriptions, name='subscriptions'),
+    path('subscriptions/<str:direction>/', views.follow_list, name='follow_list'),
+    path('usernames/', views.username_suggestions, name='username_suggestions'),
     path('unfollow/<str:username>/', views.unfollow_user, name='unfollow'),
 ] 
\ No newline at end of file
@@ -1,12 +1,23 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import login, logout, authenticate
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import redirect
+from django.contrib.auth import alogin, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
+from books_review.rendering import arender
+from books_review.replicas import replica_reads
 from .forms import LoginForm, SignUpForm, FollowUserForm
-from .models import User
+from .lookups import aload_user, user_id_for
+from .ratelimit import rate_limited
+from .usernames import suggestions
+from reviews import follows
+from reviews.feed import aget_feed_page
 from reviews.models import Ticket, Review, UserFollows
 
+SUGGESTIONS = 10
+
 
 @login_required
 def home(request):
@@ -14,44 +25,45 @@ def home(request):
     return redirect('reviews:home')
 
 
-def register(request):
+@rate_limited('register')
+async def register(request):
     """Registration page"""
-    if request.user.is_authenticated:
+    if (await aload_user(request)).is_authenticated:
         return redirect('reviews:home')
     
     if request.method == 'POST':
         form = SignUpForm(request.POST)
-        if form.is_valid():
-            user = form.save()
+        # Checking that the username is free queries the database
+        if await sync_to_async(form.is_valid)():
+            user = await form.asave()
             username = form.cleaned_data.get('username')
             messages.success(request, f'Compte créé avec succès pour {username}!')
-            login(request, user)
+            await alogin(request, user)
             return redirect('reviews:home')
     else:
         form = SignUpForm()
     
-    return render(request, 'register.html', {'form': form})
+    return await arender(request, 'register.html', {'form': form})
 
 
-def login_view(request):
+@rate_limited('login')
+async def login_view(request):
     """Login page"""
-    if request.user.is_authenticated:
+    if (await aload_user(request)).is_authenticated:
         return redirect('reviews:home')
     
     if request.method == 'POST':
         form = LoginForm(request.POST)
         if form.is_valid():
-            username = form.cleaned_data['username']
-            password = form.cleaned_data['password']
-            user = authenticate(request, username=username, password=password)
+            user = await form.aauthenticate(request)
             if user:
-                login(request, user)
+                await alogin(request, user)
                 messages.success(request, f'Bienvenue {user.username}!')
                 return redirect('reviews:home')
     else:
         form = LoginForm()
     
-    return render(request, 'login.html', {'form': form})
+    return await arender(request, 'login.html', {'form': form})
 
 
 @login_required
@@ -63,90 +75,102 @@ def logout_view(request):
 
 
 @login_required
-def dashboard(request):
+@replica_reads
+async def dashboard(request):
     """Dashboard view showing user's own tickets and reviews"""
-    # Get user's tickets and reviews
-    user_tickets = Ticket.objects.filter(user=request.user)
-    user_reviews = Review.objects.filter(user=request.user)
-    
-    # Create a combined list of user's posts
-    user_posts = []
-    
-    for ticket in user_tickets:
-        user_posts.append({
-            'type': 'ticket',
-            'object': ticket,
-            'time_created': ticket.time_created
-        })
-    
-    for review in user_reviews:
-        user_posts.append({
-            'type': 'review',
-            'object': review,
-            'time_created': review.time_created
-        })
-    
-    # Sort by creation time (newest first)
-    user_posts.sort(key=lambda x: x['time_created'], reverse=True)
-    
-    return render(request, 'dashboard.html', {'user_posts': user_posts})
+    user = await aload_user(request)
+    user_posts, next_cursor = await aget_feed_page(
+        Ticket.objects.filter(user=user),
+        Review.objects.filter(user=user),
+        cursor=request.GET.get('cursor'),
+        viewer=user,
+    )
+
+    return await arender(request, 'dashboard.html', {
+        'user_posts': user_posts,
+        'next_cursor': next_cursor,
+    })
 
 
 @login_required
-def subscriptions(request):
+@replica_reads
+async def subscriptions(request):
     """Subscriptions page - following and followers management"""
-    follow_form = FollowUserForm(current_user=request.user)
+    user = await aload_user(request)
+    follow_form = FollowUserForm(current_user=user)
     
     if request.method == 'POST':
-        follow_form = FollowUserForm(request.POST, current_user=request.user)
-        if follow_form.is_valid():
+        follow_form = FollowUserForm(request.POST, current_user=user)
+        if await sync_to_async(follow_form.is_valid)():
             username = follow_form.cleaned_data['username']
-            try:
-                user_to_follow = User.objects.get(username=username)
-                following, created = UserFollows.objects.get_or_create(
-                    user=request.user,
-                    followed_user=user_to_follow
-                )
-                if created:
-                    messages.success(request, f'Vous suivez maintenant {user_to_follow.username}!')
-                else:
-                    messages.info(request, f'Vous suivez déjà {user_to_follow.username}.')
-            except User.DoesNotExist:
-                messages.error(request, 'Utilisateur introuvable.')
+            following, created = await UserFollows.objects.aget_or_create(
+                user=user,
+                followed_user_id=follow_form.cleaned_data['user_id'],
+                defaults={'follower_username': user.username, 'followed_username': username},
+            )
+            if created:
+                messages.success(request, f'Vous suivez maintenant {username}!')
+            else:
+                messages.info(request, f'Vous suivez déjà {username}.')
             
             return redirect('authentication:subscriptions')
     
-    # Get users the current user is following
-    following_users = User.objects.filter(
-        followed_by__user=request.user
-    ).order_by('username')
-    
-    # Get users who follow the current user
-    followers = User.objects.filter(
-        following__followed_user=request.user
-    ).order_by('username')
-    
+    (following_users, following_next), (followers, followers_next) = await asyncio.gather(
+        follows.apage('following', user.id), follows.apage('followers', user.id),
+    )
     context = {
         'follow_form': follow_form,
         'following_users': following_users,
+        'following_next': following_next,
         'followers': followers,
+        'followers_next': followers_next,
     }
     
-    return render(request, 'subscriptions.html', context)
+    return await arender(request, 'subscriptions.html', context)
+
+
+@login_required
+@replica_reads
+async def follow_list(request, direction):
+    """The next rows of a list of the subscriptions page, loaded as it is scrolled"""
+    if direction not in follows.DIRECTIONS:
+        raise Http404
+    user = await aload_user(request)
+    users, next_after = await follows.apage(direction, user.id, request.GET.get('after'))
+    return await arender(request, 'follow_rows.html', {
+        'direction': direction,
+        'users': users,
+        'next_after': next_after,
+    })
+
+
+@login_required
+def username_suggestions(request):
+    """Usernames starting with the ?q= prefix, for the follow form"""
+    prefix = request.GET.get('q', '').strip()
+    if not prefix:
+        return JsonResponse({'usernames': []})
+    # One more, in case the user is among them
+    usernames = suggestions(prefix, SUGGESTIONS + 1)
+    return JsonResponse({
+        'usernames': [username for username in usernames if username != request.user.username][:SUGGESTIONS],
+    })
 
 
 @login_required
 def unfollow_user(request, username):
     """Unfollow a user"""
     if request.method == 'POST':
-        user_to_unfollow = get_object_or_404(User, username=username)
+        user_id = user_id_for(username)
+        if user_id is None:
+            raise Http404
         try:
             following = UserFollows.objects.get(
                 user=request.user,
-                followed_user=user_to_unfollow
+                followed_user_id=user_id
             )
             following.delete()
-            messages.success(request, f'Vous ne suivez plus {user_to_unfollow.username}.')
+            messages.success(request, f'Vous ne suivez plus {username}.')
         except UserFollows.DoesNotExist:
             messages.error(request, 'Vous ne suivez pas cet utilisateur.')
     
@@ -13,4 +13,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'books_review.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.urls import reverse  # noqa: E402  (needs the app registry)
+
+from reviews import events  # noqa: E402
+
+EVENTS_PATH = reverse('reviews:feed_events')
+
+
+async def application(scope, receive, send):
+    # Feed event streams stay open for hours: serve them outside Django,
+    # whose ASGI handler keeps a thread per request (see reviews.events)
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+        return await events.asgi_app(scope, receive, send)
+    return await django_application(scope, receive, send)
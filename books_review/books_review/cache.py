@@ -0,0 +1,275 @@
+"""Two-tier cache: a bounded in-process LRU in front of a shared backend.
+
+``TieredCache`` is a regular Django cache backend. Reads are served from the
+local tier when possible and fall back to the shared one (file-based or
+Redis, see settings.CACHES); writes and deletes go to both. Local entries
+live at most ``LOCAL_TIMEOUT`` seconds, which bounds how long another
+process can serve a value that was invalidated elsewhere.
+
+``get_or_compute`` adds stampede protection on top of any cache: concurrent
+misses on the same key compute the value once, in this process and across
+processes; ``aget_or_compute`` is its version for async code.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache as default_cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db import transaction
+
+from .instrumentation import cache_lookups
+
+
+class LocalLRU:
+    """Thread-safe LRU map bounded by entry count and pickled size, with TTLs"""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, now=None):
+        now = now or time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, blob = entry
+            if expires_at <= now:
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return blob
+
+    def set(self, key, blob, ttl):
+        if len(blob) > self.max_bytes:
+            self.delete(key)
+            return
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (time.monotonic() + ttl, blob)
+            self._size += len(blob)
+            while len(self._data) > self.max_entries or self._size > self.max_bytes:
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def _pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache(BaseCache):
+    """Cache backend combining a LocalLRU with the cache alias named in OPTIONS['SHARED']"""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self.local = LocalLRU(
+            max_entries=options.get('LOCAL_MAX_ENTRIES', 10000),
+            max_bytes=options.get('LOCAL_MAX_BYTES', 32 * 1024 * 1024),
+        )
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _local_ttl(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return self.local_timeout
+        return min(self.local_timeout, timeout - time.time())
+
+    def _local_set(self, key, value, version, timeout=DEFAULT_TIMEOUT):
+        ttl = self._local_ttl(timeout)
+        local_key = self.make_and_validate_key(key, version)
+        if ttl > 0:
+            self.local.set(local_key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ttl)
+        else:
+            self.local.delete(local_key)
+
+    def get(self, key, default=None, version=None):
+        blob = self.local.get(self.make_and_validate_key(key, version))
+        if blob is not None:
+            cache_lookups(1, 0)
+            return pickle.loads(blob)
+        missing = object()
+        value = self.shared.get(key, missing, version=version)
+        if value is missing:
+            cache_lookups(0, 1)
+            return default
+        cache_lookups(1, 0)
+        self._local_set(key, value, version)
+        return value
+
+    async def aget(self, key, default=None, version=None):
+        # A local hit is answered without leaving the event loop
+        blob = self.local.get(self.make_and_validate_key(key, version))
+        if blob is not None:
+            cache_lookups(1, 0)
+            return pickle.loads(blob)
+        return await super().aget(key, default, version)
+
+    def get_many(self, keys, version=None):
+        found, remote, fetched = {}, [], {}
+        for key in keys:
+            blob = self.local.get(self.make_and_validate_key(key, version))
+            if blob is not None:
+                found[key] = pickle.loads(blob)
+            else:
+                remote.append(key)
+        if remote:
+            fetched = self.shared.get_many(remote, version=version)
+            for key, value in fetched.items():
+                self._local_set(key, value, version)
+            found.update(fetched)
+        cache_lookups(len(found), len(remote) - len(fetched))
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._local_set(key, value, version, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._local_set(key, value, version, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._local_set(key, value, version, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.local.delete(self.make_and_validate_key(key, version))
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self.local.delete(self.make_and_validate_key(key, version))
+        return self.shared.incr(key, delta, version=version)
+
+    def has_key(self, key, version=None):
+        if self.local.get(self.make_and_validate_key(key, version)) is not None:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(self.make_and_validate_key(key, version))
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.local.delete(self.make_and_validate_key(key, version))
+        self.shared.delete_many(keys, version=version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _flight_lock(key):
+    with _flights_lock:
+        lock, users = _flights.get(key, (None, 0))
+        if lock is None:
+            lock = threading.Lock()
+        _flights[key] = (lock, users + 1)
+        return lock
+
+
+def _release_flight(key):
+    with _flights_lock:
+        lock, users = _flights[key]
+        if users == 1:
+            del _flights[key]
+        else:
+            _flights[key] = (lock, users - 1)
+
+
+def get_or_compute(key, compute, timeout=DEFAULT_TIMEOUT, cache=None, lock_timeout=10, poll=0.05):
+    """Return the cached value for key, computing and storing it on a miss.
+
+    Concurrent callers in this process wait on a per-key lock; other
+    processes wait on a short-lived ``<key>:lock`` entry in the cache (taken
+    with add()) and poll for the value, computing it themselves only if the
+    lock holder does not deliver within ``lock_timeout`` seconds.
+    """
+    cache = cache or default_cache
+    missing = object()
+    value = cache.get(key, missing)
+    if value is not missing:
+        return value
+
+    lock = _flight_lock(key)
+    try:
+        with lock:
+            value = cache.get(key, missing)
+            if value is not missing:
+                return value
+
+            lock_key = f'{key}:lock'
+            deadline = time.monotonic() + lock_timeout
+            while not cache.add(lock_key, 1, lock_timeout):
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(poll)
+                value = cache.get(key, missing)
+                if value is not missing:
+                    return value
+            try:
+                value = compute()
+                cache.set(key, value, timeout)
+            finally:
+                cache.delete(lock_key)
+            return value
+    finally:
+        _release_flight(key)
+
+
+async def aget_or_compute(key, compute, timeout=DEFAULT_TIMEOUT, cache=None):
+    """get_or_compute() for async code; compute is a synchronous callable.
+
+    A hit costs one ``aget``; a miss goes through get_or_compute in a
+    thread, keeping its stampede protection.
+    """
+    cache = cache or default_cache
+    missing = object()
+    value = await cache.aget(key, missing)
+    if value is not missing:
+        return value
+    return await sync_to_async(get_or_compute)(key, compute, timeout, cache)
+
+
+def invalidate(*keys, cache=None):
+    """Delete keys now and again once the current transaction commits.
+
+    The second delete drops values that a concurrent request recomputed from
+    the data as it was before the commit.
+    """
+    cache = cache or default_cache
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,323 @@
+"""Per-request performance instrumentation.
+
+``InstrumentationMiddleware`` measures a sample of the requests
+(settings.INSTRUMENTATION_SAMPLE_RATE, from 0 to 1): wall time, time spent
+in database queries and their count, queries repeated with the same
+parameters, template rendering time and default cache hits and misses.
+Each sampled response gets a ``Server-Timing`` header when
+settings.INSTRUMENTATION_SERVER_TIMING is on, so browser developer tools
+show the split, and the measures are added to per-view histograms, read
+with ``snapshot`` (JSON) or ``prometheus_text`` (Prometheus exposition
+format). Views are named after their URL pattern: ``reviews:home``.
+
+Requests that are not sampled only pay for a context variable lookup per
+query, template render and cache read. The histograms are per process:
+with several workers, scrape each of them, or sum in Prometheus.
+"""
+import random
+import threading
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates
+
+# Upper bounds, in seconds, of the duration buckets
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+UNRESOLVED = 'unresolved'
+
+
+class _Trace:
+    """What the current sampled request has spent so far"""
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.queries = 0
+        self.statements = Counter()
+        self.template_time = 0.0
+        self.rendering = False
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def duplicates(self):
+        """Queries that repeated an earlier one, parameters included"""
+        return sum(count - 1 for count in self.statements.values())
+
+    def server_timing(self, wall):
+        duplicates = self.duplicates()
+        return ', '.join([
+            f'app;dur={wall * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries, {duplicates} duplicated"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+        ])
+
+
+_trace = ContextVar('instrumentation_trace', default=None)
+
+
+def _time_query(execute, sql, params, many, context):
+    trace = _trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.db_time += perf_counter() - started
+        trace.queries += 1
+        # executemany() parameters may be a generator, consumed already
+        trace.statements[(sql, None if many else repr(params))] += 1
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def cache_lookups(hits, misses):
+    """Called by books_review.cache on each read of the default cache"""
+    trace = _trace.get()
+    if trace is not None:
+        trace.cache_hits += hits
+        trace.cache_misses += misses
+
+
+class _TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        trace = _trace.get()
+        # Templates rendered by a template tag count in the outer render
+        if trace is None or trace.rendering:
+            return self.template.render(context, request)
+        trace.rendering = True
+        started = perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            trace.template_time += perf_counter() - started
+            trace.rendering = False
+
+
+class TimedTemplates(DjangoTemplates):
+    """The Django template engine, timing its renders for the sampled requests"""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
+
+
+class Histogram:
+    """Observation counts per bucket, the last one for values above every bound"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(upper bound, observations up to it) pairs, ending with infinity"""
+        total = 0
+        for bound, count in zip((*self.buckets, float('inf')), self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, share):
+        """Upper bound of the bucket holding the given quantile"""
+        if not self.count:
+            return None
+        for bound, total in self.cumulative():
+            if total >= share * self.count:
+                return bound
+
+
+class _ViewStats:
+    def __init__(self):
+        self.responses = Counter()
+        self.wall = Histogram(DURATION_BUCKETS)
+        self.db = Histogram(DURATION_BUCKETS)
+        self.templates = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.duplicates = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.duplicated_sql = None
+
+
+_views = {}
+_views_lock = threading.Lock()
+
+
+def record(view, status, wall, trace):
+    """Add the measures of one request to the histograms of its view"""
+    duplicates = trace.duplicates()
+    with _views_lock:
+        stats = _views.get(view)
+        if stats is None:
+            stats = _views[view] = _ViewStats()
+        stats.responses[status] += 1
+        stats.wall.observe(wall)
+        stats.db.observe(trace.db_time)
+        stats.templates.observe(trace.template_time)
+        stats.queries.observe(trace.queries)
+        stats.cache_hits += trace.cache_hits
+        stats.cache_misses += trace.cache_misses
+        if duplicates:
+            stats.duplicates += duplicates
+            # The most repeated statement of the latest request with duplicates
+            (sql, _), _ = trace.statements.most_common(1)[0]
+            stats.duplicated_sql = sql
+
+
+def reset():
+    with _views_lock:
+        _views.clear()
+
+
+def snapshot():
+    """Summary of the histograms of each view, for the JSON endpoint"""
+    def milliseconds(histogram):
+        summary = {'mean': round(histogram.sum / histogram.count * 1000, 2) if histogram.count else None}
+        for name, share in (('p50', 0.5), ('p95', 0.95)):
+            # Bucket bounds: the quantile is at most this
+            bound = histogram.quantile(share)
+            if bound == float('inf'):
+                # Above every bound, which JSON cannot write as Infinity: the
+                # quantile is only known to exceed the last one
+                summary[f'{name}_above'] = histogram.buckets[-1] * 1000
+                bound = None
+            summary[f'{name}_at_most'] = bound * 1000 if bound is not None else None
+        return summary
+
+    with _views_lock:
+        return {
+            'sample_rate': settings.INSTRUMENTATION_SAMPLE_RATE,
+            'views': {
+                view: {
+                    'requests': stats.wall.count,
+                    'responses': {str(status): count for status, count in sorted(stats.responses.items())},
+                    'wall_ms': milliseconds(stats.wall),
+                    'db_ms': milliseconds(stats.db),
+                    'template_ms': milliseconds(stats.templates),
+                    'queries_mean': round(stats.queries.sum / stats.queries.count, 1),
+                    'duplicated_queries': stats.duplicates,
+                    'duplicated_sql': stats.duplicated_sql,
+                    'cache_hits': stats.cache_hits,
+                    'cache_misses': stats.cache_misses,
+                }
+                for view, stats in sorted(_views.items())
+            },
+        }
+
+
+def _label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _bound(value):
+    return '+Inf' if value == float('inf') else repr(value)
+
+
+def prometheus_text():
+    """The histograms and counters in the Prometheus text exposition format"""
+    histograms = [
+        ('request_duration_seconds', 'Wall time of the sampled requests', 'wall'),
+        ('db_duration_seconds', 'Time spent in database queries per sampled request', 'db'),
+        ('template_duration_seconds', 'Time spent rendering templates per sampled request', 'templates'),
+        ('db_queries', 'Database queries per sampled request', 'queries'),
+    ]
+    counters = [
+        ('db_duplicated_queries_total', 'Queries repeating an earlier one of the same request', 'duplicates'),
+        ('cache_hits_total', 'Default cache reads that found the key', 'cache_hits'),
+        ('cache_misses_total', 'Default cache reads that did not find the key', 'cache_misses'),
+    ]
+    lines = [
+        '# HELP books_review_instrumentation_sample_rate Share of the requests measured',
+        '# TYPE books_review_instrumentation_sample_rate gauge',
+        f'books_review_instrumentation_sample_rate {settings.INSTRUMENTATION_SAMPLE_RATE!r}',
+        '# HELP books_review_responses_total Sampled responses, per view and status code',
+        '# TYPE books_review_responses_total counter',
+    ]
+    with _views_lock:
+        views = sorted(_views.items())
+        for view, stats in views:
+            for status, count in sorted(stats.responses.items()):
+                lines.append(f'books_review_responses_total{{view="{_label(view)}",status="{status}"}} {count}')
+        for name, description, attribute in histograms:
+            lines += [f'# HELP books_review_{name} {description}', f'# TYPE books_review_{name} histogram']
+            for view, stats in views:
+                histogram = getattr(stats, attribute)
+                for bound, total in histogram.cumulative():
+                    lines.append(f'books_review_{name}_bucket{{view="{_label(view)}",le="{_bound(bound)}"}} {total}')
+                lines.append(f'books_review_{name}_sum{{view="{_label(view)}"}} {histogram.sum!r}')
+                lines.append(f'books_review_{name}_count{{view="{_label(view)}"}} {histogram.count}')
+        for name, description, attribute in counters:
+            lines += [f'# HELP books_review_{name} {description}', f'# TYPE books_review_{name} counter']
+            for view, stats in views:
+                lines.append(f'books_review_{name}{{view="{_label(view)}"}} {getattr(stats, attribute)}')
+    return '\n'.join(lines) + '\n'
+
+
+class InstrumentationMiddleware:
+    """Measures a sample of the requests; first in MIDDLEWARE, to see them whole"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= settings.INSTRUMENTATION_SAMPLE_RATE:
+            return self.get_response(request)
+        trace = _Trace()
+        token = _trace.set(trace)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _trace.reset(token)
+        return self.finish(request, response, trace, perf_counter() - started)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.INSTRUMENTATION_SAMPLE_RATE:
+            return await self.get_response(request)
+        trace = _Trace()
+        token = _trace.set(trace)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _trace.reset(token)
+        return self.finish(request, response, trace, perf_counter() - started)
+
+    def finish(self, request, response, trace, wall):
+        # Streamed responses are measured up to their first byte
+        match = getattr(request, 'resolver_match', None)
+        record(match.view_name if match else UNRESOLVED, response.status_code, wall, trace)
+        if settings.INSTRUMENTATION_SERVER_TIMING:
+            response['Server-Timing'] = trace.server_timing(wall)
+        return response
@@ -0,0 +1,12 @@
+"""Template rendering for async views.
+
+Rendering runs the template engine and the context processors, and card
+fragments come from the cache (file or Redis backend): none of it may block
+the event loop. Both run in the thread of the sync ORM calls instead, since
+a template may still reach the database (a lazy relation, a context
+processor) and connections are only opened and closed in that thread.
+"""
+from asgiref.sync import sync_to_async
+from django.shortcuts import render
+
+arender = sync_to_async(render)
@@ -0,0 +1,155 @@
+"""Read replicas: routing of read-only page queries, with read-your-writes.
+
+settings.DATABASE_REPLICAS lists the aliases of the replicas (see
+books_review.databases.replica_configs). ``ReplicaRouter`` sends every write
+to the primary and, by default, every read too: reads go to the replicas,
+in turn, only inside views decorated with ``replica_reads``, for GET and
+HEAD requests.
+
+A replica lags behind the primary, so a client that has just written must
+not read from one, or the ticket it created would be missing from the page
+it is redirected to. Once a request writes, its remaining queries use the
+primary, and ``ReplicaMiddleware`` sets a cookie pinning the requests of
+the next DATABASE_REPLICA_PIN_SECONDS to the primary as well. Reads inside
+a transaction, and session reads, always use the primary.
+
+Every connection counts its queries per alias (``query_counts``), which
+shows how the load is split between the databases.
+"""
+import itertools
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PIN_COOKIE = 'primary_reads'
+SAFE_METHODS = ('GET', 'HEAD')
+# Apps whose rows are read right after they are written, by every request
+PRIMARY_APPS = {'sessions'}
+
+
+class _Reads:
+    """Where the queries of the current request may read from"""
+
+    def __init__(self, pinned):
+        self.replicas = False
+        self.pinned = pinned
+        self.wrote = False
+
+
+_reads = ContextVar('replica_reads', default=None)
+_next_replica = itertools.count()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        reads = _reads.get()
+        replicas = settings.DATABASE_REPLICAS
+        if reads is None or not reads.replicas or reads.pinned or not replicas:
+            return None
+        if model._meta.app_label in PRIMARY_APPS or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return replicas[next(_next_replica) % len(replicas)]
+
+    def db_for_write(self, model, **hints):
+        reads = _reads.get()
+        if reads is not None:
+            reads.pinned = reads.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Tracks the writes of each request and pins the client after them"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        reads = _Reads(pinned=PIN_COOKIE in request.COOKIES)
+        token = _reads.set(reads)
+        try:
+            response = self.get_response(request)
+        finally:
+            _reads.reset(token)
+        return self.pin(reads, response)
+
+    async def __acall__(self, request):
+        reads = _Reads(pinned=PIN_COOKIE in request.COOKIES)
+        token = _reads.set(reads)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _reads.reset(token)
+        return self.pin(reads, response)
+
+    def pin(self, reads, response):
+        if reads.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.DATABASE_REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
+
+
+def _allow_replicas(request):
+    reads = _reads.get()
+    if reads is not None and request.method in SAFE_METHODS:
+        reads.replicas = True
+
+
+def replica_reads(view):
+    """Let the view read from the replicas, unless the client is pinned"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            _allow_replicas(request)
+            return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            _allow_replicas(request)
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+_counts = Counter()
+_counts_lock = threading.Lock()
+
+
+def _count_query(execute, sql, params, many, context):
+    alias = context['connection'].alias
+    with _counts_lock:
+        _counts[alias] += 1
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def count_queries(sender, connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def query_counts():
+    """Queries executed by this process, per database alias"""
+    with _counts_lock:
+        return dict(_counts)
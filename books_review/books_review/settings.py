@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 
+from .databases import database_config, replica_configs
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -43,7 +45,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'books_review.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'books_review.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -56,7 +60,8 @@ ROOT_URLCONF = 'books_review.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timing the renders of the instrumented requests
+        'BACKEND': 'books_review.instrumentation.TimedTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -74,12 +79,64 @@ WSGI_APPLICATION = 'books_review.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# PostgreSQL or SQLite, chosen by DATABASE_URL (see books_review.databases)
 
 DATABASES = {
+    'default': database_config(os.environ, BASE_DIR / 'db.sqlite3'),
+    **replica_configs(os.environ),
+}
+
+# Read replicas, used by the views decorated with replicas.replica_reads
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['books_review.replicas.ReplicaRouter']
+# How long a client keeps reading from the primary after writing
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DATABASE_REPLICA_PIN_SECONDS', 5))
+
+
+# Cache
+# The default cache keeps a small in-process LRU in front of the shared
+# cache, which is Redis when REDIS_URL is set and files on disk otherwise.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'books_review.cache.TieredCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_TIMEOUT': int(os.environ.get('CACHE_LOCAL_TIMEOUT', 5)),
+            'LOCAL_MAX_ENTRIES': 10000,
+            'LOCAL_MAX_BYTES': 32 * 1024 * 1024,
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    } if os.environ.get('REDIS_URL') else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', BASE_DIR / '.cache'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+
+# Request instrumentation (books_review.instrumentation): the share of the
+# requests measured, whether their responses carry a Server-Timing header,
+# and the bearer token a Prometheus scraper sends to /metrics/
+
+INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('INSTRUMENTATION_SAMPLE_RATE', 1 if DEBUG else 0.1))
+INSTRUMENTATION_SERVER_TIMING = os.environ.get('INSTRUMENTATION_SERVER_TIMING', str(DEBUG)).lower() not in (
+    '0', 'false', 'no', 'off'
+)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+
+# Live feed events (reviews.events): relayed through Redis pub/sub when
+# REDIS_URL is set, so that every process receives them
+
+FEED_EVENTS_BROKER = {
+    'BACKEND': 'reviews.events.RedisBroker',
+    'OPTIONS': {'url': os.environ['REDIS_URL']},
+} if os.environ.get('REDIS_URL') else {
+    'BACKEND': 'reviews.events.LocalBroker',
 }
 
 
@@ -102,6 +159,59 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing (authentication.hashers): PASSWORD_HASHER chooses the
+# algorithm of new hashes, pbkdf2, scrypt or argon2 (which needs the argon2
+# extra), with the costs below. Hashes made with another algorithm or other
+# costs are upgraded when their user logs in.
+
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+_HASHERS = {
+    'pbkdf2': 'authentication.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'authentication.hashers.ScryptPasswordHasher',
+    'argon2': 'authentication.hashers.Argon2PasswordHasher',
+}
+PASSWORD_HASHERS = [_HASHERS[PASSWORD_HASHER], *(path for name, path in _HASHERS.items() if name != PASSWORD_HASHER)]
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 1_000_000))
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.environ.get('PASSWORD_SCRYPT_WORK_FACTOR', 2 ** 14))
+PASSWORD_SCRYPT_BLOCK_SIZE = int(os.environ.get('PASSWORD_SCRYPT_BLOCK_SIZE', 8))
+PASSWORD_SCRYPT_PARALLELISM = int(os.environ.get('PASSWORD_SCRYPT_PARALLELISM', 5))
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get('PASSWORD_ARGON2_TIME_COST', 2))
+# In KiB
+PASSWORD_ARGON2_MEMORY_COST = int(os.environ.get('PASSWORD_ARGON2_MEMORY_COST', 102400))
+PASSWORD_ARGON2_PARALLELISM = int(os.environ.get('PASSWORD_ARGON2_PARALLELISM', 8))
+# Threads hashing the passwords of the async login and registration views
+PASSWORD_HASHING_THREADS = int(os.environ.get('PASSWORD_HASHING_THREADS', os.cpu_count() or 1))
+
+# In-memory username index of the follow form's suggestions
+# (authentication.usernames): how often each process adds the users created
+# elsewhere, and reloads it whole
+USERNAME_INDEX_REFRESH_SECONDS = int(os.environ.get('USERNAME_INDEX_REFRESH_SECONDS', 5))
+USERNAME_INDEX_REBUILD_SECONDS = int(os.environ.get('USERNAME_INDEX_REBUILD_SECONDS', 3600))
+
+# Login and registration attempts (authentication.ratelimit): per scope, a
+# token bucket per client IP and per username, as (burst, refill per minute)
+RATE_LIMITS = {
+    'login': {'ip': (20, 10), 'username': (10, 5)},
+    'register': {'ip': (5, 2)},
+}
+# Cache alias sharing the buckets between processes; process memory if empty
+RATE_LIMIT_CACHE = os.environ.get('RATE_LIMIT_CACHE', '')
+# Header holding the client address, set by a trusted reverse proxy
+RATE_LIMIT_CLIENT_IP_HEADER = os.environ.get('RATE_LIMIT_CLIENT_IP_HEADER', '')
+
+# Django's default logging, without a warning per rate limited attempt
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'skip_rate_limited': {'()': 'authentication.ratelimit.SkipRejected'},
+    },
+    'loggers': {
+        'django.request': {'filters': ['skip_rate_limited']},
+    },
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -121,7 +231,17 @@ STATIC_URL = 'static/'
 
 # Media files (user uploaded content)
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', BASE_DIR / 'media')
+# Uploads are stored once per distinct content, named after its SHA-256
+STORAGES = {
+    'default': {'BACKEND': 'reviews.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+# A stored file saved again within this delay, and not referenced yet, is not
+# deleted with its last previous reference (reviews.media)
+MEDIA_COLLECT_GRACE_SECONDS = int(os.environ.get('MEDIA_COLLECT_GRACE_SECONDS', 60 * 60))
+# Ticket images larger than this are refused while they are uploaded
+IMAGE_UPLOAD_MAX_SIZE = int(os.environ.get('IMAGE_UPLOAD_MAX_SIZE', 25 * 2 ** 20))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -130,6 +250,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 AUTH_USER_MODEL = 'authentication.User'
+# Resolves the user of each session from the session cache (authentication.lookups)
+AUTHENTICATION_BACKENDS = ['authentication.backends.CachedModelBackend']
+
+# Sessions are read from the cache and written to the database as well. They
+# skip the in-process tier, so that a logout takes effect in every process.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'shared'
+# Flash messages travel in a signed cookie: showing one writes no session,
+# and anonymous visitors get none
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
 
 # Login/Logout URLs
 LOGIN_URL = '/auth/login/'
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Ticket, Review, UserFollows
+from .models import Ticket, Review, UserFollows, ImageJob, MediaBlob
 
 
 @admin.register(Ticket)
@@ -22,3 +22,17 @@ class ReviewAdmin(admin.ModelAdmin):
 class UserFollowsAdmin(admin.ModelAdmin):
     list_display = ('user', 'followed_user')
     list_filter = ('user', 'followed_user')
+
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ('source', 'ticket', 'status', 'attempts', 'time_updated')
+    list_filter = ('status',)
+    readonly_fields = ('time_created', 'time_updated')
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'references')
+    search_fields = ('name',)
+    readonly_fields = ('name', 'references')
@@ -0,0 +1,95 @@
+"""Cache of the rendered, viewer-independent part of feed cards.
+
+A fragment is stored under the id and version stamp of its post; a review
+fragment also embeds its ticket and the name of the ticket's author, so it
+is keyed by the stamps of the ticket and of that user too.
+Saving or deleting a post, or renaming a user, replaces its stamp (see
+reviews.signals), which makes the old fragments unreachable. A page costs two cache round-trips
+(stamps, then fragments) plus one write for the misses.
+"""
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+FRAGMENT_TIMEOUT = 24 * 60 * 60
+TEMPLATES = {
+    'ticket': 'reviews/cards/ticket.html',
+    'review': 'reviews/cards/review.html',
+}
+
+_counters = {'hits': 0, 'misses': 0}
+_counters_lock = threading.Lock()
+
+
+def _version_key(post_type, post_id):
+    return f'card-version:{post_type}:{post_id}'
+
+
+def bump(post_type, post_id):
+    """Give a post (or a 'user') a new version stamp, invalidating its cached fragments"""
+    cache.set(_version_key(post_type, post_id), time.time_ns(), None)
+
+
+def _versions(posts):
+    """Version stamps of (post_type, post_id) pairs, creating the missing ones"""
+    keys = {post: _version_key(*post) for post in posts}
+    found = cache.get_many(keys.values())
+    versions, created = {}, {}
+    for post, key in keys.items():
+        if key in found:
+            versions[post] = found[key]
+        else:
+            # A stamp that expired or was evicted must not match old fragments
+            versions[post] = created[key] = time.time_ns()
+    if created:
+        cache.set_many(created, None)
+    return versions
+
+
+def _dependencies(item):
+    obj = item['object']
+    if item['type'] == 'review':
+        return [('review', obj.id), ('ticket', obj.ticket_id), ('user', obj.ticket.user_id)]
+    return [('ticket', obj.id)]
+
+
+def render_bodies(items):
+    """Set item['body_html'] on feed items, rendering only the cache misses"""
+    versions = _versions({post for item in items for post in _dependencies(item)})
+    keys = [
+        'card:' + ':'.join(f'{post_type}:{post_id}:{versions[post_type, post_id]}'
+                           for post_type, post_id in _dependencies(item))
+        for item in items
+    ]
+    cached = cache.get_many(keys)
+
+    rendered = {}
+    for item, key in zip(items, keys):
+        html = cached.get(key)
+        if html is None:
+            html = rendered[key] = render_to_string(
+                TEMPLATES[item['type']], {item['type']: item['object']}
+            )
+        item['body_html'] = mark_safe(html)
+    if rendered:
+        cache.set_many(rendered, FRAGMENT_TIMEOUT)
+
+    with _counters_lock:
+        _counters['hits'] += len(items) - len(rendered)
+        _counters['misses'] += len(rendered)
+    return items
+
+
+async def arender_bodies(items):
+    """render_bodies() for async views, with its cache round-trips and rendering out of the event loop"""
+    return await sync_to_async(render_bodies)(items)
+
+
+def stats():
+    """Hit and miss counts of the fragment cache since the process started"""
+    with _counters_lock:
+        return dict(_counters)
@@ -0,0 +1,244 @@
+"""Live feed events, pushed to the home page over Server-Sent Events.
+
+Once the transaction creating a ticket or review commits, a ``{'type', 'id'}``
+event is published to every user whose timeline shows the post (see
+timeline.fan_out). The ``feed_events`` view streams the events of one user;
+the page then fetches the card of each new post and prepends it.
+
+An open stream is a coroutine waiting on an asyncio.Queue. Through Django,
+every ASGI request runs its middleware in a thread that lives as long as
+the response, so books_review.asgi routes the stream to ``asgi_app``
+instead: it holds no thread and no database connection, and a process can
+keep thousands of streams open. For the same reason the stream is
+authorized by a signed token (``token_for``) rather than by the session
+cookie; the token names the session, and is refused once the session ends
+(logout, password change, deactivation).
+
+The broker is set by settings.FEED_EVENTS_BROKER. LocalBroker delivers the
+events published in its own process; RedisBroker relays them through Redis
+pub/sub, for deployments running several processes.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.core import signing
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 100
+HEARTBEAT = 25
+RETRY_MS = 5000
+TOKEN_SALT = 'reviews.events'
+TOKEN_MAX_AGE = 24 * 60 * 60
+# Seconds between attempts to reach Redis again, doubling up to the maximum
+RECONNECT_DELAY = 1
+RECONNECT_MAX_DELAY = 30
+
+
+def token_for(user_id, session_key):
+    return signing.dumps([user_id, session_key], salt=TOKEN_SALT)
+
+
+def user_for_token(token):
+    """The user id a token was issued for, or None if it is invalid, expired or its session ended"""
+    try:
+        user_id, session_key = signing.loads(token, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    # The checks of a page request: the session's user, backend, password
+    # hash and active flag
+    user = auth.get_user(SimpleNamespace(session=session))
+    return user_id if user.is_authenticated and user.pk == user_id else None
+
+
+async def auser_for_token(token):
+    return await sync_to_async(user_for_token)(token)
+
+
+def _offer(queue, event):
+    if queue.full():
+        # A client that stopped reading loses its oldest events
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+class LocalBroker:
+    """Delivers events to the subscribers of this process"""
+
+    def __init__(self, **options):
+        self._subscribers = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Return a queue receiving user_id's events; call it from the event loop"""
+        queue = asyncio.Queue(QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[user_id][queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            queues = self._subscribers.get(user_id, {})
+            queues.pop(queue, None)
+            if not queues:
+                self._subscribers.pop(user_id, None)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(queues) for queues in self._subscribers.values())
+
+    def deliver(self, user_ids, event):
+        """Hand event to the local subscribers of user_ids; safe from any thread"""
+        with self._lock:
+            targets = [item for user_id in user_ids for item in self._subscribers.get(user_id, {}).items()]
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                # The subscriber's loop was closed
+                pass
+
+    def publish(self, user_ids, event):
+        self.deliver(user_ids, event)
+
+
+class RedisBroker(LocalBroker):
+    """Relays events between processes through a Redis pub/sub channel.
+
+    Every process publishes to the channel and runs one listener thread that
+    delivers the received events to its own subscribers.
+    """
+    channel = 'feed-events'
+
+    def __init__(self, url, **options):
+        super().__init__(**options)
+        self.url = url
+        self._listener = None
+        self._redis = None
+
+    def _client(self):
+        """The broker's client, whose connection pool serves every publish and the listener"""
+        with self._lock:
+            if self._redis is None:
+                import redis
+
+                self._redis = redis.Redis.from_url(self.url)
+            return self._redis
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='feed-events', daemon=True)
+                self._listener.start()
+        return super().subscribe(user_id)
+
+    def _listen(self):
+        delay = RECONNECT_DELAY
+        while True:
+            pubsub = self._client().pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                delay = RECONNECT_DELAY
+                for message in pubsub.listen():
+                    self._receive(message)
+            except Exception:
+                # Redis restarted or is unreachable: events published
+                # meanwhile are lost, the following ones are delivered
+                logger.exception('Feed events listener disconnected from Redis, retrying in %s s', delay)
+                time.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+            finally:
+                pubsub.close()
+
+    def _receive(self, message):
+        try:
+            payload = json.loads(message['data'])
+            user_ids, event = payload['users'], payload['event']
+        except (ValueError, KeyError, TypeError):
+            logger.warning('Ignored a malformed feed event: %r', message.get('data'))
+            return
+        self.deliver(user_ids, event)
+
+    def publish(self, user_ids, event):
+        self._client().publish(self.channel, json.dumps({'users': list(user_ids), 'event': event}))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            config = settings.FEED_EVENTS_BROKER
+            _broker = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+        return _broker
+
+
+def post_created(post_type, post_id, user_ids):
+    """Announce a new post to user_ids once the current transaction commits"""
+    event = {'type': post_type, 'id': post_id}
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: broker().publish(user_ids, event))
+
+
+async def stream(user_id):
+    """Server-Sent Events of one user's new posts, with a comment as heartbeat"""
+    current = broker()
+    queue = current.subscribe(user_id)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            yield f'event: post\ndata: {json.dumps(event)}\n\n'
+    finally:
+        current.unsubscribe(user_id, queue)
+
+
+async def asgi_app(scope, receive, send):
+    """ASGI application serving ``stream`` without going through Django"""
+    token = parse_qs(scope['query_string'].decode()).get('token', [''])[0]
+    user_id = await auser_for_token(token)
+    if user_id is None:
+        await send({'type': 'http.response.start', 'status': 403, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/event-stream'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no'),
+    ]})
+
+    async def forward():
+        async for chunk in stream(user_id):
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    tasks = [asyncio.ensure_future(forward()), asyncio.ensure_future(disconnected())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
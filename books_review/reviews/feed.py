@@ -0,0 +1,175 @@
+"""Feed engine: merges tickets and reviews in the database, one page at a time.
+
+Pages are ordered newest first on ``(time_created, id, type)`` and addressed
+with an opaque keyset cursor, so fetching a page never loads more
+than ``page_size + 1`` rows whatever the size of the tables.
+
+The ``a``-prefixed functions are the async versions used by async views.
+"""
+import asyncio
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import BooleanField, CharField, Exists, OuterRef, Q, Value
+
+from .models import Ticket, Review
+
+PAGE_SIZE = 20
+
+
+def encode_cursor(time_created, post_type, post_id):
+    """Pack a feed position into an opaque, URL-safe token"""
+    raw = f'{time_created.isoformat()}|{post_type}|{post_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Unpack a token built by encode_cursor, or return None if it is invalid"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        time_created, post_type, post_id = raw.split('|')
+        if post_type not in ('ticket', 'review'):
+            return None
+        return datetime.fromisoformat(time_created), post_type, int(post_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def _after_cursor(post_type, cursor):
+    """Condition selecting the rows of one post type that come after the cursor.
+
+    The leading ``time_created <=`` bound lets the database seek into the
+    (time_created, id) index instead of scanning from the newest row.
+    """
+    time_created, cursor_type, cursor_id = cursor
+    if post_type < cursor_type:
+        # On a full (time_created, id) tie, the "smaller" type sorts after the cursor
+        tie_break = Q(id__lte=cursor_id)
+    else:
+        tie_break = Q(id__lt=cursor_id)
+    return Q(time_created__lte=time_created) & (Q(time_created__lt=time_created) | tie_break)
+
+
+def _keys(queryset, post_type, cursor):
+    """Reduce a queryset to the (time_created, type, id) feed key"""
+    if cursor is not None:
+        queryset = queryset.filter(_after_cursor(post_type, cursor))
+    return queryset.order_by().annotate(
+        type=Value(post_type, output_field=CharField())
+    ).values_list('time_created', 'type', 'id')
+
+
+def annotate_tickets(tickets, viewer=None):
+    """Add reviewed_by_me, for the viewer, to a ticket queryset.
+
+    Review count and average come from the statistics stored on Ticket.
+    """
+    if viewer is not None and viewer.is_authenticated:
+        reviewed_by_me = Exists(Review.objects.filter(ticket=OuterRef('pk'), user=viewer))
+    else:
+        reviewed_by_me = Value(False, output_field=BooleanField())
+    return tickets.annotate(reviewed_by_me=reviewed_by_me)
+
+
+def _hydration_querysets(rows, viewer=None):
+    """The queries loading the posts of (time_created, type, id) rows, by post type"""
+    ticket_ids = [post_id for _, post_type, post_id in rows if post_type == 'ticket']
+    review_ids = [post_id for _, post_type, post_id in rows if post_type == 'review']
+
+    querysets = {}
+    if ticket_ids:
+        tickets = Ticket.objects.filter(id__in=ticket_ids).select_related('user').order_by()
+        querysets['ticket'] = annotate_tickets(tickets, viewer)
+    if review_ids:
+        querysets['review'] = Review.objects.filter(id__in=review_ids).select_related(
+            'user', 'ticket__user'
+        ).order_by()
+    return querysets
+
+
+def _items(rows, objects):
+    items = []
+    for _, post_type, post_id in rows:
+        obj = objects.get((post_type, post_id))
+        # The post may have been deleted between the two queries
+        if obj is not None:
+            items.append({
+                'type': post_type,
+                'object': obj,
+                'time_created': obj.time_created,
+            })
+    return items
+
+
+def hydrate(rows, viewer=None):
+    """Turn (time_created, type, id) rows into the feed item dicts used by templates.
+
+    Authors and reviewed tickets are joined in, and tickets carry the
+    annotate_tickets() flag, so a page costs two queries whatever its size.
+    """
+    objects = {}
+    for post_type, queryset in _hydration_querysets(rows, viewer).items():
+        for obj in queryset:
+            objects[post_type, obj.id] = obj
+    return _items(rows, objects)
+
+
+async def ahydrate(rows, viewer=None):
+    """hydrate(), with the ticket and review queries awaited together"""
+    async def fetch(post_type, queryset):
+        return {(post_type, obj.id): obj async for obj in queryset}
+
+    objects = {}
+    fetches = [fetch(post_type, queryset) for post_type, queryset in _hydration_querysets(rows, viewer).items()]
+    for fetched in await asyncio.gather(*fetches):
+        objects.update(fetched)
+    return _items(rows, objects)
+
+
+def merged_keys(tickets, reviews, cursor=None):
+    """UNION ALL of the feed keys of two querysets, ordered newest first.
+
+    ``cursor`` is a decoded position; only the rows after it are selected.
+    """
+    return _keys(tickets, 'ticket', cursor).union(
+        _keys(reviews, 'review', cursor), all=True
+    ).order_by('-time_created', '-id', '-type')
+
+
+def get_feed_page(tickets, reviews, cursor=None, page_size=PAGE_SIZE, viewer=None):
+    """Return one page of the merged feed and the cursor of the next page.
+
+    ``tickets`` and ``reviews`` are querysets (possibly filtered) and are
+    combined with a single UNION ALL ordered on the feed key. ``viewer`` is
+    the user the reviewed_by_me annotation is computed for.
+    """
+    keys = merged_keys(tickets, reviews, decode_cursor(cursor))
+    return paginate(keys, page_size, viewer)
+
+
+async def aget_feed_page(tickets, reviews, cursor=None, page_size=PAGE_SIZE, viewer=None):
+    keys = merged_keys(tickets, reviews, decode_cursor(cursor))
+    return await apaginate(keys, page_size, viewer)
+
+
+def _split_page(rows, page_size):
+    """Drop the extra row fetched to detect a next page; return (rows, next_cursor)"""
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, encode_cursor(*rows[-1])
+    return rows, None
+
+
+def paginate(keys, page_size=PAGE_SIZE, viewer=None):
+    """Fetch one page from an ordered queryset of feed keys and hydrate it"""
+    rows, next_cursor = _split_page(list(keys[:page_size + 1]), page_size)
+    return hydrate(rows, viewer), next_cursor
+
+
+async def apaginate(keys, page_size=PAGE_SIZE, viewer=None):
+    rows, next_cursor = _split_page([row async for row in keys[:page_size + 1]], page_size)
+    return await ahydrate(rows, viewer), next_cursor
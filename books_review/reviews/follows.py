@@ -0,0 +1,147 @@
+"""Cached view of the follow graph.
+
+Both directions are cached per user as lists of ``{'id', 'username'}``
+sorted by username, for the timeline fan-out; ``page`` shows them PAGE_SIZE
+rows at a time, selecting the rows after a username (usernames are unique,
+so no tie-breaker is needed). UserFollows keeps a copy of both usernames,
+indexed after the user id, so a list is read in username order from an
+index: a page deep in a list of a million followers costs an index range
+scan of PAGE_SIZE rows, with neither an OFFSET nor a sort. First pages are
+cached too. reviews.signals invalidates all of them when a follow is created or
+removed and when a user is renamed, and moves the follower_count and
+following_count of both users. Another process may serve
+the previous list for up to the local cache timeout (see
+books_review.cache); ``rebuild_timelines`` repairs a timeline that missed a
+post meanwhile.
+"""
+from asgiref.sync import sync_to_async
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from books_review.cache import aget_or_compute, get_or_compute, invalidate
+
+from authentication.models import User
+from .models import UserFollows
+
+FOLLOWS_TIMEOUT = 60 * 60
+PAGE_SIZE = 50
+DIRECTIONS = ('following', 'followers')
+# The UserFollows columns of each direction: the user whose list it is, then
+# the id and the username of the users listed
+_COLUMNS = {
+    'following': ('user_id', 'followed_user_id', 'followed_username'),
+    'followers': ('followed_user_id', 'user_id', 'follower_username'),
+}
+RECOUNT_BATCH = 1000
+
+
+def _key(direction, user_id):
+    return f'{direction}:{user_id}'
+
+
+def _keys(direction, user_id):
+    """The cached list and first page of one direction"""
+    return [_key(direction, user_id), _key(f'{direction}-page', user_id)]
+
+
+def _rows(direction, user_id, after=None, limit=None):
+    owner, member, username = _COLUMNS[direction]
+    rows = UserFollows.objects.filter(**{owner: user_id})
+    if after:
+        rows = rows.filter(**{f'{username}__gt': after})
+    rows = rows.order_by(username).values_list(member, username)
+    if limit is not None:
+        rows = rows[:limit]
+    return [{'id': member_id, 'username': member_username} for member_id, member_username in rows]
+
+
+def _following(user_id):
+    return _rows('following', user_id)
+
+
+def _followers(user_id):
+    return _rows('followers', user_id)
+
+
+def following(user_id):
+    """Users followed by user_id"""
+    return get_or_compute(_key('following', user_id), lambda: _following(user_id), FOLLOWS_TIMEOUT)
+
+
+def followers(user_id):
+    """Users following user_id"""
+    return get_or_compute(_key('followers', user_id), lambda: _followers(user_id), FOLLOWS_TIMEOUT)
+
+
+def _page(direction, user_id, after):
+    # One more row tells whether there is a next page
+    rows = _rows(direction, user_id, after, PAGE_SIZE + 1)
+    return rows[:PAGE_SIZE], rows[PAGE_SIZE - 1]['username'] if len(rows) > PAGE_SIZE else None
+
+
+def page(direction, user_id, after=None):
+    """Up to PAGE_SIZE users of a direction coming after the username after, and the after of the next page or None"""
+    if after:
+        return _page(direction, user_id, after)
+    return get_or_compute(_key(f'{direction}-page', user_id), lambda: _page(direction, user_id, None), FOLLOWS_TIMEOUT)
+
+
+async def apage(direction, user_id, after=None):
+    if after:
+        return await sync_to_async(_page)(direction, user_id, after)
+    return await aget_or_compute(
+        _key(f'{direction}-page', user_id), lambda: _page(direction, user_id, None), FOLLOWS_TIMEOUT,
+    )
+
+
+def follower_ids(user_id):
+    return [follower['id'] for follower in followers(user_id)]
+
+
+def follow_changed(user_id, followed_user_id):
+    invalidate(*_keys('following', user_id), *_keys('followers', followed_user_id))
+
+
+def _move(user_id, field, delta):
+    users = User.objects.filter(pk=user_id)
+    if delta < 0:
+        # Never below zero, should the count have drifted
+        users = users.filter(**{f'{field}__gte': -delta})
+    users.update_users([user_id], **{field: F(field) + delta})
+
+
+def count_follow(user_id, followed_user_id, delta):
+    """Add delta to the following_count of user_id and the follower_count of followed_user_id.
+
+    F() updates: concurrent follows of a popular user all add up.
+    """
+    _move(user_id, 'following_count', delta)
+    _move(followed_user_id, 'follower_count', delta)
+
+
+def recount(user_ids):
+    """Recompute the follow counts of users whose follows were changed in bulk"""
+    def counted(field):
+        follows = UserFollows.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+        return Coalesce(Subquery(follows.annotate(count=Count('pk')).values('count')), 0)
+
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), RECOUNT_BATCH):
+        batch = user_ids[start:start + RECOUNT_BATCH]
+        User.objects.filter(pk__in=batch).update_users(
+            batch, follower_count=counted('followed_user'), following_count=counted('user'),
+        )
+
+
+def forget(user_ids):
+    """Drop the cached lists of users whose follows were changed in bulk"""
+    invalidate(*[key for user_id in user_ids for direction in DIRECTIONS for key in _keys(direction, user_id)])
+
+
+def user_renamed(user_id, username):
+    """Copy the new username into the user's follows and drop every cached list the user appears in"""
+    UserFollows.objects.filter(user_id=user_id).update(follower_username=username)
+    UserFollows.objects.filter(followed_user_id=user_id).update(followed_username=username)
+    keys = [key for follower in followers(user_id) for key in _keys('following', follower['id'])]
+    keys += [key for followed in following(user_id) for key in _keys('followers', followed['id'])]
+    invalidate(*keys)
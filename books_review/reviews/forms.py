@@ -1,7 +1,33 @@
 from django import forms
+from PIL import UnidentifiedImageError
+from .images import sniff
 from .models import Ticket, Review
 
 
+class ImageUploadField(forms.FileField):
+    """Image field that only checks the file header.
+
+    Decoding, cleaning and resizing happen later in the image worker, so
+    the request does not get slower with the size of the image.
+    """
+    default_error_messages = {
+        'invalid_image': 'Téléversez une image valide. Le fichier envoyé n\'est pas une image ou est corrompu.',
+    }
+
+    def to_python(self, data):
+        if getattr(data, 'upload_error', None):
+            # Refused by reviews.uploads.ImageUploadHandler
+            raise forms.ValidationError(data.upload_error, code='rejected_upload')
+        uploaded = super().to_python(data)
+        if uploaded is None:
+            return None
+        try:
+            sniff(uploaded)
+        except (UnidentifiedImageError, ValueError, OSError):
+            raise forms.ValidationError(self.error_messages['invalid_image'], code='invalid_image')
+        return uploaded
+
+
 class TicketForm(forms.ModelForm):
     title = forms.CharField(
         max_length=128,
@@ -19,7 +45,7 @@ class TicketForm(forms.ModelForm):
             'rows': 4
         })
     )
-    image = forms.ImageField(
+    image = ImageUploadField(
         required=False,
         widget=forms.FileInput(attrs={
             'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-primary-500 focus:border-transparent',
@@ -92,7 +118,7 @@ class TicketReviewForm(forms.Form):
             'rows': 4
         })
     )
-    ticket_image = forms.ImageField(
+    ticket_image = ImageUploadField(
         required=False,
         label='Image',
         widget=forms.FileInput(attrs={
@@ -0,0 +1,162 @@
+"""Ticket image pipeline.
+
+Requests only check an upload's header (``sniff``) and store it as is. The
+image worker (reviews.jobs) then runs ``process`` on it: it verifies the
+file, re-encodes it without its metadata (EXIF, GPS, comments) and writes
+fixed-width JPEG and WebP renditions, recorded in ``Ticket.image_renditions``
+so that templates can offer a ``srcset`` instead of the full-size original.
+"""
+import posixpath
+from io import BytesIO
+
+import django
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from . import cards
+from .storage import ContentAddressedStorage, is_content_addressed
+
+# Cards show images at most 20rem (320px) wide; 640 covers 2x screens
+WIDTHS = (160, 320, 640)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+ACCEPTED = {'JPEG', 'MPO', 'PNG', 'WEBP', 'GIF', 'BMP', 'TIFF'}
+STRIPPABLE = {'JPEG', 'MPO', 'PNG', 'WEBP'}
+EXIF_ORIENTATION = 0x0112
+DERIVED_DIR = 'derived'
+
+
+def sniff(uploaded):
+    """Format of an uploaded image, read from its header without decoding it.
+
+    Raises UnidentifiedImageError (or ValueError for a format that is not
+    accepted) when the upload is not an image.
+    """
+    uploaded.seek(0)
+    with Image.open(uploaded) as image:
+        image_format = image.format
+    uploaded.seek(0)
+    if image_format not in ACCEPTED:
+        raise ValueError(f'Unsupported image format {image_format}')
+    return image_format
+
+
+def strip_metadata(uploaded):
+    """Return the image re-encoded without metadata, upright, in its own format,
+    or None when the format is kept as is"""
+    uploaded.seek(0)
+    with Image.open(uploaded) as image:
+        image_format = 'JPEG' if image.format == 'MPO' else image.format
+        if image.format not in STRIPPABLE:
+            return None
+        options = {}
+        if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+            image = ImageOps.exif_transpose(image)
+            if image_format == 'JPEG':
+                options = {'quality': 90}
+        elif image.format == 'JPEG':
+            # Re-use the original quantization tables: no visible recompression
+            options = {'quality': 'keep'}
+        output = BytesIO()
+        image.save(output, image_format, **options)
+    return ContentFile(output.getvalue(), name=uploaded.name)
+
+
+def _flatten(image):
+    """RGB copy of the image, with transparency composited on white"""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _rendition_name(source, width, extension):
+    stem = posixpath.splitext(posixpath.basename(source))[0]
+    directory = posixpath.dirname(source)
+    if is_content_addressed(source):
+        # Next to the shard directories rather than inside one
+        directory = posixpath.dirname(directory)
+    return posixpath.join(directory, DERIVED_DIR, f'{stem}-{width}w.{extension}')
+
+
+def render(source, storage=default_storage):
+    """Write the renditions of an image file and describe them.
+
+    Target widths larger than the image are replaced by the image's own
+    width rather than upscaled.
+    """
+    with storage.open(source, 'rb') as stored, Image.open(stored) as image:
+        image = _flatten(ImageOps.exif_transpose(image))
+    widths = sorted({min(width, image.width) for width in WIDTHS})
+    renditions = {'source': source, 'width': image.width, 'height': image.height}
+    for extension, (image_format, options) in FORMATS.items():
+        renditions[extension] = []
+        for width in widths:
+            height = round(image.height * width / image.width)
+            output = BytesIO()
+            image.resize((width, height), Image.LANCZOS).save(output, image_format, **options)
+            name = storage.save(_rendition_name(source, width, extension), ContentFile(output.getvalue()))
+            renditions[extension].append([width, name])
+    return renditions
+
+
+def init_worker_process():
+    """Process pool initializer: a spawned worker starts without Django set up.
+
+    It lives here rather than next to the pool because this module can be
+    imported before the app registry is ready. Saves do not mark their files
+    in reviews.media: jobs.complete references them instead.
+    """
+    django.setup()
+    ContentAddressedStorage.mark_saved = False
+
+
+def process(source, storage=default_storage):
+    """Verify, clean and resize a stored upload; return (clean_name, renditions).
+
+    The cleaned image is saved under a new name (the source is left for the
+    caller to delete), or the source itself is kept for formats that are
+    not re-encoded. Runs in the worker processes: it must not touch the
+    database.
+    """
+    with storage.open(source, 'rb') as stored:
+        with Image.open(stored) as image:
+            image.verify()
+        cleaned = strip_metadata(stored)
+    name = storage.save(source, cleaned) if cleaned is not None else source
+    return name, render(name, storage)
+
+
+def is_current(ticket):
+    """Whether the stored renditions belong to the ticket's current image"""
+    source = ticket.image.name if ticket.image else None
+    return ticket.image_renditions.get('source') == source
+
+
+def refresh(ticket):
+    """Render a ticket's missing renditions synchronously; return whether they changed"""
+    # Imported here: reviews.media needs the models, which worker processes
+    # cannot load before init_worker_process has run
+    from . import media
+
+    if is_current(ticket):
+        return False
+    if ticket.image and not ticket.image.storage.exists(ticket.image.name):
+        # Nothing to resize; the renditions are built if the file shows up
+        return False
+    previous = ticket.image_renditions
+    ticket.image_renditions = render(ticket.image.name) if ticket.image else {}
+    type(ticket).objects.filter(pk=ticket.pk).update(image_renditions=ticket.image_renditions)
+    media.acquire(media.rendition_names(ticket.image_renditions))
+    media.release(media.rendition_names(previous))
+    cards.bump('ticket', ticket.pk)
+    return True
+
+
+def srcset(renditions, extension):
+    return ', '.join(f'{default_storage.url(name)} {width}w' for width, name in renditions.get(extension, []))
@@ -0,0 +1,115 @@
+"""Database-backed queue of ticket images to process.
+
+A request that stores a new ticket image only enqueues an ImageJob (see
+reviews.signals); ``run_image_worker`` claims pending jobs, runs
+``images.process`` on them in a pool of processes and applies the results.
+Until then the ticket shows a placeholder instead of its image.
+
+Workers claim a job with a conditional UPDATE, so several of them can share
+the queue. A job whose worker died is handed out again once it has been
+running for ``STALE_AFTER``.
+
+An active job holds a reference to its source file (see reviews.media),
+dropped when the job is done, fails for good or is deleted with its ticket.
+"""
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+
+from . import cards, media
+from .models import Ticket, ImageJob
+
+MAX_ATTEMPTS = 3
+STALE_AFTER = timedelta(minutes=10)
+# Errors meaning the upload itself is unusable: retrying cannot help
+INVALID_IMAGE_ERRORS = (UnidentifiedImageError, SyntaxError, ValueError, Image.DecompressionBombError)
+
+
+def enqueue(ticket):
+    """Queue the ticket's current image unless it already is"""
+    job, created = ImageJob.objects.get_or_create(
+        ticket=ticket, source=ticket.image.name,
+        status__in=[ImageJob.PENDING, ImageJob.RUNNING],
+        defaults={'status': ImageJob.PENDING},
+    )
+    if created:
+        media.acquire([job.source])
+    return job
+
+
+def requeue_stale():
+    """Hand out again the jobs of workers that stopped without finishing them"""
+    return ImageJob.objects.filter(
+        status=ImageJob.RUNNING, time_updated__lt=timezone.now() - STALE_AFTER
+    ).update(status=ImageJob.PENDING, time_updated=timezone.now())
+
+
+def claim(limit):
+    """Mark up to limit pending jobs as running for this worker and return them"""
+    candidates = ImageJob.objects.filter(status=ImageJob.PENDING).order_by('id').values_list('id', flat=True)
+    claimed = [
+        job_id for job_id in candidates[:limit]
+        # Another worker may have claimed the job since it was listed
+        if ImageJob.objects.filter(id=job_id, status=ImageJob.PENDING).update(
+            status=ImageJob.RUNNING, attempts=F('attempts') + 1, time_updated=timezone.now()
+        )
+    ]
+    return list(ImageJob.objects.filter(id__in=claimed).order_by('id'))
+
+
+def _finish(job, status):
+    """Move a running job to a final status; False if it was deleted meanwhile"""
+    job.status = status
+    return bool(ImageJob.objects.filter(pk=job.pk, status=ImageJob.RUNNING).update(
+        status=status, error=job.error, time_updated=timezone.now()
+    ))
+
+
+def complete(job, clean_name, renditions, storage=default_storage):
+    """Attach a processed image to its ticket, unless the ticket moved on to another image"""
+    produced = media.ticket_files(clean_name, renditions)
+    # The worker's saves are not marked (see reviews.media): a file it found
+    # already stored may have been collected since
+    media.acquire(produced)
+    if not all(storage.exists(name) for name in set(produced)):
+        media.release(produced, storage)
+        job.status, job.error = ImageJob.PENDING, 'Processed files deleted meanwhile'
+        ImageJob.objects.filter(pk=job.pk, status=ImageJob.RUNNING).update(
+            status=job.status, error=job.error, time_updated=timezone.now()
+        )
+        return
+    ticket = Ticket.objects.filter(pk=job.ticket_id, image=job.source)
+    previous = ticket.values_list('image_renditions', flat=True).first()
+    if ticket.update(image=clean_name, image_renditions=renditions):
+        # The ticket now references the produced files instead of its
+        # upload and the renditions of the image this one replaced
+        released = media.ticket_files(job.source, previous or {})
+        cards.bump('ticket', job.ticket_id)
+    else:
+        released = produced
+    job.error = ''
+    if _finish(job, ImageJob.DONE):
+        released.append(job.source)
+    media.release(released, storage)
+
+
+def fail(job, error, storage=default_storage):
+    """Record a failed attempt; give up on invalid images and after MAX_ATTEMPTS"""
+    job.error = f'{type(error).__name__}: {error}'
+    if job.attempts < MAX_ATTEMPTS and not isinstance(error, INVALID_IMAGE_ERRORS):
+        job.status = ImageJob.PENDING
+        ImageJob.objects.filter(pk=job.pk).update(status=job.status, error=job.error, time_updated=timezone.now())
+        return
+    released = []
+    # Stop showing the placeholder of an image that will never be ready
+    ticket = Ticket.objects.filter(pk=job.ticket_id, image=job.source)
+    previous = ticket.values_list('image_renditions', flat=True).first()
+    if ticket.update(image='', image_renditions={}):
+        released += media.ticket_files(job.source, previous or {})
+        cards.bump('ticket', job.ticket_id)
+    if _finish(job, ImageJob.FAILED):
+        released.append(job.source)
+    media.release(released, storage)
@@ -0,0 +1,230 @@
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import time
+import tracemalloc
+from itertools import cycle
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from books_review.replicas import query_counts
+from reviews.models import Ticket, Review, UserFollows
+from .seed_data import PASSWORD
+
+SCENARIOS = ['home', 'dashboard', 'subscriptions', 'create_review', 'login']
+HEADLINE = 'bench-app review'
+# Compared between runs, in this order
+METRICS = ['p50_ms', 'p95_ms', 'p99_ms', 'queries_mean', 'memory_peak_kib']
+
+
+def percentile(ordered, share):
+    return ordered[min(int(len(ordered) * share), len(ordered) - 1)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def client_for(user=None):
+    # A host the settings accept; with DEBUG and no ALLOWED_HOSTS, localhost
+    host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+    client = Client(HTTP_HOST=host)
+    if user is not None:
+        client.force_login(user)
+    return client
+
+
+class Command(BaseCommand):
+    help = 'Measure latency, queries and memory per request of the main pages on the seed_data users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='seed', help='Username prefix given to seed_data')
+        parser.add_argument('--password', default=PASSWORD, help='Password given to seed_data, for login')
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='Repeatable (default: all)')
+        parser.add_argument('--requests', type=int, default=100, help='Timed requests per scenario')
+        parser.add_argument(
+            '--profile', type=int, default=20, help='Further requests per scenario traced for memory'
+        )
+        parser.add_argument('--users', type=int, default=50, help='Seeded users the requests are spread over')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+
+    def handle(self, *args, **options):
+        users = list(get_user_model().objects.filter(username__startswith=f'{options["prefix"]}-').order_by('id'))
+        if not users:
+            raise CommandError(f'No users named {options["prefix"]}-*: run seed_data first.')
+        rng = random.Random(options['seed'])
+        self.users = rng.sample(users, min(options['users'], len(users)))
+        self.rng = rng
+        self.password = options['password']
+        self.clients = []
+        self.overrides = []
+        # Warm the caches up, as a running server would have
+        self.warm_up = min(len(self.users), options['requests'])
+        count = self.warm_up + options['requests'] + options['profile']
+
+        results = {
+            'commit': git_commit(),
+            'date': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'debug': settings.DEBUG,
+            'dataset': {
+                'users': get_user_model().objects.count(),
+                'follows': UserFollows.objects.count(),
+                'tickets': Ticket.objects.count(),
+                'reviews': Review.objects.count(),
+            },
+            'scenarios': {},
+        }
+        try:
+            for name in options['scenario'] or SCENARIOS:
+                send, status = getattr(self, f'prepare_{name}')(count)
+                results['scenarios'][name] = self.measure(send, status, options['requests'], options['profile'])
+        finally:
+            self.clean_up()
+        results['max_rss_mib'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+        self.report(results, options['compare'])
+        if options['output']:
+            os.makedirs(os.path.dirname(os.path.abspath(options['output'])), exist_ok=True)
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def logged_in_clients(self):
+        clients = [client_for(user) for user in self.users]
+        self.clients += clients
+        return cycle(clients)
+
+    def prepare_get(self, url):
+        clients = self.logged_in_clients()
+        return lambda: next(clients).get(url), 200
+
+    def prepare_home(self, count):
+        return self.prepare_get(reverse('reviews:home'))
+
+    def prepare_dashboard(self, count):
+        return self.prepare_get(reverse('authentication:dashboard'))
+
+    def prepare_subscriptions(self, count):
+        return self.prepare_get(reverse('authentication:subscriptions'))
+
+    def prepare_create_review(self, count):
+        """Reviews of tickets the users have not reviewed yet, deleted by clean_up"""
+        reviews = []
+        per_user = count // len(self.users) + 1
+        for user in self.users:
+            candidates = Ticket.objects.exclude(user=user).exclude(review__user=user).order_by('-id')
+            candidates = list(candidates.values_list('id', flat=True)[:per_user * 4])
+            client = client_for(user)
+            self.clients.append(client)
+            reviews += [(client, ticket_id) for ticket_id in self.rng.sample(candidates, min(per_user, len(candidates)))]
+        if len(reviews) < count:
+            raise CommandError(f'Only {len(reviews)} tickets to review: seed more data or use fewer --requests.')
+        self.rng.shuffle(reviews)
+        pending = iter(reviews)
+
+        def send():
+            client, ticket_id = next(pending)
+            return client.post(reverse('reviews:create_review', args=[ticket_id]), {
+                'rating': self.rng.randint(0, 5), 'headline': HEADLINE, 'body': 'Avis de test de charge',
+            })
+        # Redirected to the feed once created
+        return send, 302
+
+    def prepare_login(self, count):
+        users = cycle(self.users)
+        # The rate limits would soon reject this one client logging in again and again
+        limits = override_settings(RATE_LIMITS={**settings.RATE_LIMITS, 'login': {}})
+        limits.enable()
+        self.overrides.append(limits)
+
+        def send():
+            client = client_for()
+            self.clients.append(client)
+            return client.post(
+                reverse('authentication:login'), {'username': next(users).username, 'password': self.password},
+            )
+        # A failed login renders the form again, with a 200
+        return send, 302
+
+    def measure(self, send, status, requests, profile):
+        for _ in range(self.warm_up):
+            send()
+        latencies, queries, errors = [], [], 0
+        for _ in range(requests):
+            before = sum(query_counts().values())
+            started = time.perf_counter()
+            response = send()
+            latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(sum(query_counts().values()) - before)
+            errors += response.status_code != status
+
+        # Tracing allocations slows requests down: it has its own pass
+        peaks = []
+        for _ in range(profile):
+            tracemalloc.start()
+            try:
+                send()
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+
+        latencies.sort()
+        return {
+            'requests': requests,
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'mean_ms': round(statistics.fmean(latencies), 2),
+            'queries_mean': round(statistics.fmean(queries), 1),
+            'queries_max': max(queries),
+            'memory_peak_kib': round(max(peaks) / 1024, 1) if peaks else None,
+        }
+
+    def clean_up(self):
+        Review.objects.filter(user__in=self.users, headline=HEADLINE).delete()
+        for client in self.clients:
+            # Deletes the session
+            client.logout()
+        for override in self.overrides:
+            override.disable()
+
+    def report(self, results, compare):
+        previous = {}
+        if compare:
+            with open(compare) as source:
+                previous = json.load(source)
+            self.stdout.write(f'Compared with {compare} (commit {previous.get("commit")}): new (change)')
+        dataset = results['dataset']
+        self.stdout.write(
+            f'{dataset["users"]} users, {dataset["follows"]} follows, {dataset["tickets"]} tickets, '
+            f'{dataset["reviews"]} reviews; {connection.vendor}, commit {results["commit"]}'
+        )
+        self.stdout.write(f'{"scenario":<14}' + ''.join(f'{metric:>16}' for metric in ['errors', *METRICS]))
+        for name, result in results['scenarios'].items():
+            before = previous.get('scenarios', {}).get(name, {})
+            cells = [str(result['errors'])]
+            for metric in METRICS:
+                cell = f'{result[metric]}'
+                if before.get(metric):
+                    cell += f' ({(result[metric] - before[metric]) / before[metric]:+.0%})'
+                cells.append(cell)
+            self.stdout.write(f'{name:<14}' + ''.join(f'{cell:>16}' for cell in cells))
+        self.stdout.write(f'Peak process memory: {results["max_rss_mib"]} MiB')
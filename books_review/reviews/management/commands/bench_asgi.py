@@ -0,0 +1,167 @@
+import http.client
+import importlib.util
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+# A threaded WSGI server from the standard library, for the synchronous path
+WSGI_SERVER = '''
+import sys
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from books_review.wsgi import application
+
+
+class Server(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+make_server('127.0.0.1', int(sys.argv[1]), application, Server, QuietHandler).serve_forever()
+'''
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(server, port):
+    if server == 'uvicorn':
+        return [
+            sys.executable, '-m', 'uvicorn', 'books_review.asgi:application',
+            '--port', str(port), '--log-level', 'warning', '--no-access-log',
+        ]
+    return [sys.executable, '-c', WSGI_SERVER, str(port)]
+
+
+def wait_until_listening(process, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f'The server exited with status {process.returncode}.')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise CommandError('The server did not start listening in time.')
+
+
+def fetch(port, path, cookie):
+    """GET path on a new connection; return (status, seconds)"""
+    started = time.perf_counter()
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        connection.request('GET', path, headers={'Host': 'localhost', 'Cookie': cookie})
+        response = connection.getresponse()
+        response.read()
+        return response.status, time.perf_counter() - started
+    finally:
+        connection.close()
+
+
+def load(port, paths, cookie, concurrency, requests):
+    """Send requests GETs over the paths from concurrency threads; return (latencies, errors, seconds)"""
+    latencies, errors = [], []
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            path = paths[index % len(paths)]
+            try:
+                status, elapsed = fetch(port, path, cookie)
+            except OSError as error:
+                errors.append(f'{path}: {error}')
+                continue
+            if status != 200:
+                errors.append(f'{path}: HTTP {status}')
+            latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = 'Compare the requests/sec of the feed, dashboard and subscriptions pages under uvicorn and WSGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User the pages are requested as')
+        parser.add_argument(
+            '--server', action='append', choices=['uvicorn', 'wsgi'],
+            help='Server to measure, repeatable (default: both)'
+        )
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--requests', type=int, default=600, help='Requests per server')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'Unknown user {options["username"]!r}.')
+        servers = options['server'] or ['uvicorn', 'wsgi']
+        if 'uvicorn' in servers and importlib.util.find_spec('uvicorn') is None:
+            raise CommandError('uvicorn is not installed: pip install uvicorn')
+
+        paths = [reverse('reviews:home'), reverse('authentication:dashboard'), reverse('authentication:subscriptions')]
+        client = Client()
+        client.force_login(user)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'books_review.settings')}
+
+        self.stdout.write(
+            f'{options["requests"]} requests over {", ".join(paths)}, {options["concurrency"]} concurrent clients'
+        )
+        self.stdout.write(f'{"server":<8} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"errors":>7}')
+        try:
+            for server in servers:
+                port = free_port()
+                process = subprocess.Popen(server_command(server, port), cwd=settings.BASE_DIR, env=env)
+                try:
+                    wait_until_listening(process, port)
+                    # Warm up the caches and the server's imports
+                    load(port, paths, cookie, 1, len(paths) * 2)
+                    latencies, errors, elapsed = load(
+                        port, paths, cookie, options['concurrency'], options['requests']
+                    )
+                finally:
+                    process.terminate()
+                    process.wait()
+                for error in errors[:5]:
+                    self.stderr.write(error)
+                if not latencies:
+                    raise CommandError(f'{server}: no request completed.')
+                latencies.sort()
+                self.stdout.write(
+                    f'{server:<8} {len(latencies) / elapsed:>8.1f} '
+                    f'{statistics.median(latencies) * 1000:>8.1f} '
+                    f'{latencies[int(len(latencies) * 0.95)] * 1000:>8.1f} {len(errors):>7}'
+                )
+        finally:
+            client.logout()
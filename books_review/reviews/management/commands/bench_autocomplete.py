@@ -0,0 +1,59 @@
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from authentication.usernames import UsernameIndex
+from .bench_search import vocabulary
+
+
+class Command(BaseCommand):
+    help = 'Measure the username suggestions index on synthetic usernames (the database is not used)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000)
+        parser.add_argument('--queries', type=int, default=10000)
+        parser.add_argument('--limit', type=int, default=10, help='Suggestions per query')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        words, cum_weights = vocabulary(rng, 5000)
+        usernames = {
+            f'{rng.choices(words, cum_weights=cum_weights)[0]}{rng.choice(["", "_", "."])}{number}'
+            for number in range(options['users'])
+        }
+        usernames = list(usernames)
+
+        tracemalloc.start()
+        began = time.perf_counter()
+        index = UsernameIndex()
+        index.load(usernames)
+        loaded = time.perf_counter() - began
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.stdout.write(
+            f'{len(index)} usernames loaded in {loaded:.2f}s, index of {memory / 2 ** 20:.0f} MiB '
+            f'besides the username strings'
+        )
+
+        # Prefixes typed in the form: the first letters of existing usernames
+        prefixes = [username[:rng.randint(1, 6)] for username in rng.choices(usernames, k=options['queries'])]
+        durations, found = [], 0
+        for prefix in prefixes:
+            started = time.perf_counter()
+            found += len(index.search(prefix, options['limit']))
+            durations.append(time.perf_counter() - started)
+        durations.sort()
+        self.stdout.write(
+            f'{options["queries"]} queries, {found / len(prefixes):.1f} suggestions each: '
+            f'p50 {statistics.median(durations) * 1e6:.1f} µs, '
+            f'p99 {durations[int(len(durations) * 0.99)] * 1e6:.1f} µs, max {durations[-1] * 1e6:.1f} µs'
+        )
+
+        began = time.perf_counter()
+        for number in range(1000):
+            index.add(f'new-user-{number}')
+        per_user = (time.perf_counter() - began) / 1000
+        self.stdout.write(f'Adding a user: {per_user * 1000:.3f} ms')
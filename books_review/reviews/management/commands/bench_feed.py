@@ -0,0 +1,97 @@
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from reviews.feed import encode_cursor, get_feed_page
+from reviews.models import Ticket, Review
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark data at the end of the run"""
+
+
+@contextmanager
+def explicit_time_created():
+    """Let bulk_create keep the given time_created instead of auto_now_add's value"""
+    fields = [model._meta.get_field('time_created') for model in (Ticket, Review)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'Measure feed page latency as the number of posts grows (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='1000,10000,100000,1000000',
+            help='Comma-separated total numbers of posts to measure at'
+        )
+        parser.add_argument('--repeat', type=int, default=20, help='Page fetches per measure')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        try:
+            with transaction.atomic():
+                self.run(sizes, options['repeat'], options['batch_size'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, sizes, repeat, batch_size):
+        user = get_user_model().objects.create(username='bench-feed-user')
+        start = timezone.now()
+        created = 0
+        ticket = None
+
+        self.stdout.write(f'{"posts":>10} {"first page":>12} {"deep page":>12}')
+        for size in sizes:
+            while created < size:
+                count = min(batch_size, size - created)
+                # One post per second, alternating a ticket and a review of it
+                stamps = {i: start - timedelta(seconds=i) for i in range(created, created + count)}
+                tickets = {
+                    i: Ticket(title=f'Ticket {i}', user=user, time_created=stamp)
+                    for i, stamp in stamps.items() if i % 2 == 0
+                }
+                with explicit_time_created():
+                    Ticket.objects.bulk_create(tickets.values())
+                    reviews = []
+                    for i, stamp in stamps.items():
+                        if i % 2:
+                            ticket = tickets.get(i - 1, ticket)
+                            reviews.append(Review(
+                                ticket=ticket, user=user, rating=i % 6,
+                                headline=f'Review {i}', time_created=stamp,
+                            ))
+                        else:
+                            ticket = tickets[i]
+                    Review.objects.bulk_create(reviews)
+                created += count
+
+            first = self.measure(repeat, None)
+            # Jump to a ticket half way down the feed
+            time_created, ticket_id = Ticket.objects.order_by(
+                '-time_created', '-id'
+            ).values_list('time_created', 'id')[size // 4]
+            deep = self.measure(repeat, encode_cursor(time_created, 'ticket', ticket_id))
+            self.stdout.write(f'{size:>10} {first:>10.2f}ms {deep:>10.2f}ms')
+
+    def measure(self, repeat, cursor):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            get_feed_page(Ticket.objects.all(), Review.objects.all(), cursor=cursor)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
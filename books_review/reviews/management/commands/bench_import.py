@@ -0,0 +1,103 @@
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from reviews.transfer import Importer, export_records
+from .bench_feed import Rollback
+from .bench_search import vocabulary
+
+PREFIX = 'bench-import'
+
+
+def peak_memory_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = 'Measure import_reviews and export_reviews throughput on a synthetic JSONL file (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000000, help='Records in the file, one ticket for four reviews')
+        parser.add_argument('--users', type=int, default=10000, help='Distinct authors')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if get_user_model().objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError(f'Users named {PREFIX}* exist already: delete them first.')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'reviews.jsonl')
+            began = time.perf_counter()
+            self.generate(path, options['rows'], options['users'])
+            self.stdout.write(
+                f'Generated {options["rows"]} records ({os.path.getsize(path) / 2 ** 20:.0f} MiB) '
+                f'in {time.perf_counter() - began:.1f}s'
+            )
+            try:
+                with transaction.atomic():
+                    self.run(path, options['rows'], options['batch_size'])
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def generate(self, path, rows, users):
+        rng = random.Random(42)
+        words, cum_weights = vocabulary(rng, 5000)
+        with open(path, 'w', encoding='utf-8') as output:
+            line = ticket = 0
+            while line < rows:
+                owner = ticket % users
+                output.write(json.dumps({
+                    'type': 'ticket', 'id': ticket, 'user': f'{PREFIX}-{owner}',
+                    'title': ' '.join(rng.choices(words, cum_weights=cum_weights, k=3)),
+                    'time_created': '2024-01-01T00:00:00+00:00',
+                }) + '\n')
+                line += 1
+                for reviewer in range(1, min(5, rows - line + 1)):
+                    output.write(json.dumps({
+                        'type': 'review', 'ticket': ticket, 'user': f'{PREFIX}-{(owner + reviewer * 7) % users}',
+                        'rating': rng.randint(0, 5),
+                        'headline': ' '.join(rng.choices(words, cum_weights=cum_weights, k=4)),
+                        'body': ' '.join(rng.choices(words, cum_weights=cum_weights, k=20)),
+                        'time_created': '2024-01-02T00:00:00+00:00',
+                    }) + '\n')
+                    line += 1
+                ticket += 1
+
+    def run(self, path, rows, batch_size):
+        importer = Importer(batch_size=batch_size)
+        step = max(rows // 10, 1)
+        began = time.perf_counter()
+        with open(path, encoding='utf-8') as source:
+            for number, line in enumerate(source, start=1):
+                importer.add(number, json.loads(line))
+                if number % step == 0:
+                    elapsed = time.perf_counter() - began
+                    self.stdout.write(
+                        f'  {number} records, {number / elapsed:.0f} records/s, peak memory {peak_memory_mb():.0f} MiB'
+                    )
+        counts = importer.finish()
+        elapsed = time.perf_counter() - began
+        self.stdout.write(
+            f'Import: {counts["tickets"]} tickets, {counts["reviews"]} reviews, {counts["users"]} users '
+            f'in {elapsed:.1f}s = {rows / elapsed:.0f} records/s, peak memory {peak_memory_mb():.0f} MiB'
+        )
+
+        began = time.perf_counter()
+        exported = 0
+        with open(os.devnull, 'w', encoding='utf-8') as output:
+            for record in export_records():
+                output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                exported += 1
+        elapsed = time.perf_counter() - began
+        self.stdout.write(
+            f'Export: {exported} records in {elapsed:.1f}s = {exported / elapsed:.0f} records/s, '
+            f'peak memory {peak_memory_mb():.0f} MiB'
+        )
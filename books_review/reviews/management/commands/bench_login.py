@@ -0,0 +1,137 @@
+import asyncio
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher, make_password, verify_password
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import reverse
+
+from authentication import passwords, ratelimit
+from .bench_app import client_for
+
+USERNAME = 'bench-login'
+PASSWORD = 'bench-login-pass-123'
+POLICIES = ['pbkdf2', 'scrypt', 'argon2']
+
+
+def policy_settings(policy):
+    """PASSWORD_HASHERS preferring the policy, as settings.PASSWORD_HASHER would"""
+    preferred = [path for path in settings.PASSWORD_HASHERS if path.rsplit('.', 1)[-1].lower().startswith(policy)]
+    return [*preferred, *(path for path in settings.PASSWORD_HASHERS if path not in preferred)]
+
+
+class Command(BaseCommand):
+    help = 'Measure password checks and logins per second and per core under each hashing policy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--policy', action='append', choices=POLICIES, help='Repeatable (default: all)')
+        parser.add_argument('--checks', type=int, default=20, help='Password checks per measurement')
+        parser.add_argument('--logins', type=int, default=10, help='Login requests per policy')
+        parser.add_argument(
+            '--threads', type=int, default=settings.PASSWORD_HASHING_THREADS, help='Threads of the hashing pool'
+        )
+        parser.add_argument(
+            '--burst', type=int, default=100, help='Attempts of each simulated credential-stuffing burst (0: none)'
+        )
+
+    def handle(self, *args, **options):
+        if get_user_model().objects.filter(username=USERNAME).exists():
+            raise CommandError(f'A user named {USERNAME} exists already: delete it first.')
+        cores = os.cpu_count() or 1
+        threads = options['threads']
+        self.stdout.write(f'{cores} cores, hashing pool of {threads} threads')
+        self.stdout.write(
+            f'{"policy":<10}{"check ms":>10}{"/s/core":>10}{"pool /s":>10}{"pool /s/core":>14}{"login p50 ms":>14}'
+        )
+        for policy in options['policy'] or POLICIES:
+            # Every login comes from one client, for one user: no rate limit
+            with override_settings(
+                PASSWORD_HASHERS=policy_settings(policy), PASSWORD_HASHING_THREADS=threads,
+                RATE_LIMITS={**settings.RATE_LIMITS, 'login': {}},
+            ):
+                try:
+                    encoded = make_password(PASSWORD)
+                except ValueError as error:
+                    # The library of the algorithm is missing
+                    self.stdout.write(f'{policy:<10}skipped: {error}')
+                    continue
+                # A pool of the requested size
+                passwords.shutdown()
+                try:
+                    self.measure(policy, encoded, options, cores, threads)
+                finally:
+                    passwords.shutdown()
+        if options['burst']:
+            self.bursts(options['burst'])
+
+    def bursts(self, attempts):
+        """Wrong passwords posted as fast as possible, under the rate limits of the settings"""
+        self.stdout.write(f'Bursts of {attempts} failed logins, rate limits {settings.RATE_LIMITS["login"]}')
+        self.stdout.write(f'{"burst":<24}{"allowed":>10}{"rejected":>10}{"CPU ms/allowed":>16}{"CPU ms/rejected":>16}')
+        user = get_user_model().objects.create_user(username=USERNAME, password=PASSWORD)
+        try:
+            self.burst('many users, one address', [(f'{USERNAME}-{number}', '192.0.2.1') for number in range(attempts)])
+            self.burst('one user, many addresses', [
+                (USERNAME, f'198.18.{number // 256 % 256}.{number % 256}') for number in range(attempts)
+            ])
+        finally:
+            user.delete()
+
+    def burst(self, name, attempts):
+        cpu = {200: [], 429: []}
+        before = ratelimit.stats()
+        for username, address in attempts:
+            client = client_for()
+            client.defaults['REMOTE_ADDR'] = address
+            # Process time includes the threads of the hashing pool
+            started = time.process_time()
+            response = client.post(reverse('authentication:login'), {'username': username, 'password': 'wrong'})
+            cpu[response.status_code].append(time.process_time() - started)
+        rejected = ratelimit.stats().get('login:rejected', 0) - before.get('login:rejected', 0)
+
+        def mean_ms(durations):
+            return f'{statistics.fmean(durations) * 1000:.2f}' if durations else '-'
+        self.stdout.write(
+            f'{name:<24}{len(cpu[200]):>10}{rejected:>10}{mean_ms(cpu[200]):>16}{mean_ms(cpu[429]):>16}'
+        )
+
+    def measure(self, policy, encoded, options, cores, threads):
+        checks = options['checks']
+        durations = []
+        for _ in range(checks):
+            started = time.perf_counter()
+            verify_password(PASSWORD, encoded)
+            durations.append(time.perf_counter() - started)
+        check = statistics.median(durations)
+
+        async def burst():
+            started = time.perf_counter()
+            await asyncio.gather(*(passwords.run(verify_password, PASSWORD, encoded) for _ in range(checks * threads)))
+            return checks * threads / (time.perf_counter() - started)
+        pooled = asyncio.run(burst())
+
+        user = get_user_model().objects.create(username=USERNAME, password=encoded)
+        latencies = []
+        try:
+            for _ in range(options['logins']):
+                client = client_for()
+                started = time.perf_counter()
+                response = client.post(reverse('authentication:login'), {'username': USERNAME, 'password': PASSWORD})
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 302:
+                    raise CommandError(f'Login failed under {policy}, with status {response.status_code}.')
+                client.logout()
+        finally:
+            # Deleting drops the cached user too
+            user.delete()
+
+        self.stdout.write(
+            f'{policy:<10}{check * 1000:>10.1f}{1 / check:>10.1f}{pooled:>10.1f}'
+            f'{pooled / min(threads, cores):>14.1f}{statistics.median(latencies) * 1000:>14.1f}'
+        )
+        costs = {name: value for name, value in get_hasher().safe_summary(encoded).items() if name not in ('salt', 'hash')}
+        self.stdout.write(f'{"":<10}' + ', '.join(f'{name} {value}' for name, value in costs.items()))
@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from reviews import search
+from reviews.models import Ticket, Review
+from .bench_feed import Rollback
+
+SYLLABLES = 'ba be bi bo bu da de di do du la le li lo lu ma me mi mo mu ra re ri ro ru sa se si so su ta te ti to tu'.split()
+
+
+def vocabulary(rng, size):
+    """Pseudo-words with Zipf-like frequencies, like natural text"""
+    words = sorted({''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(size * 2)})[:size]
+    rng.shuffle(words)
+    cum_weights = list(accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    return words, cum_weights
+
+
+class Command(BaseCommand):
+    help = 'Compare FTS5 and LIKE search latency on a synthetic corpus (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reviews', type=int, default=1000000, help='Number of reviews to generate')
+        parser.add_argument('--repeat', type=int, default=10, help='Runs per query')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if not search.fts_enabled():
+            raise CommandError('FTS5 search needs the SQLite backend.')
+        try:
+            with transaction.atomic():
+                self.seed(options['reviews'], options['batch_size'])
+                self.compare(options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count, batch_size):
+        rng = random.Random(42)
+        self.words, cum_weights = vocabulary(rng, 20000)
+        # Every review needs its own (ticket, user) pair
+        width = int(count ** 0.5) + 1
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(username=f'bench-search-{i}') for i in range(width)
+        )
+        tickets = Ticket.objects.bulk_create(Ticket(title=f'Bench {i}', user=users[0]) for i in range(width))
+        for start in range(0, count, batch_size):
+            Review.objects.bulk_create(
+                Review(
+                    ticket=tickets[i // width], user=users[i % width], rating=rng.randint(0, 5),
+                    headline=' '.join(rng.choices(self.words, cum_weights=cum_weights, k=4)),
+                    body=' '.join(rng.choices(self.words, cum_weights=cum_weights, k=60)),
+                )
+                for i in range(start, min(start + batch_size, count))
+            )
+        started = time.perf_counter()
+        search.rebuild()
+        self.stdout.write(f'Indexed {count} reviews in {time.perf_counter() - started:.1f}s')
+
+    def compare(self, repeat):
+        self.stdout.write(f'{"query":<24} {"fts5":>10} {"like":>12}')
+        # From the most frequent word to rare and missing ones, plus multi-word and prefix queries
+        words = self.words
+        queries = [
+            words[0], words[100], words[5000], 'introuvable',
+            f'{words[50]} {words[400]}', words[3000][:4],
+        ]
+        for query in queries:
+            fts = self.measure(search.fts_search, query, repeat)
+            like = self.measure(search.like_search, query, repeat)
+            self.stdout.write(f'{query:<24} {fts:>8.2f}ms {like:>10.2f}ms')
+
+    def measure(self, find, query, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            find(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,121 @@
+import asyncio
+import http.client
+import importlib.util
+import os
+import re
+import subprocess
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from reviews import events
+from reviews.models import Ticket
+from .bench_asgi import free_port, server_command, wait_until_listening
+
+
+def process_status(pid):
+    """(resident bytes, thread count) of a process"""
+    with open(f'/proc/{pid}/status') as status:
+        fields = dict(line.split(':', 1) for line in status)
+    return int(fields['VmRSS'].split()[0]) * 1024, int(fields['Threads'])
+
+
+def request(port, method, path, cookie, body=None, headers=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        connection.request(method, path, body=body, headers={'Host': 'localhost', 'Cookie': cookie, **(headers or {})})
+        response = connection.getresponse()
+        return response, response.read()
+    finally:
+        connection.close()
+
+
+async def open_stream(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n'.encode())
+    await writer.drain()
+    await reader.readuntil(b'retry: ')
+    return reader, writer
+
+
+async def wait_for_post(reader):
+    await reader.readuntil(b'event: post\n')
+
+
+class Command(BaseCommand):
+    help = 'Hold many idle Server-Sent Events connections on uvicorn and time the delivery of a new post'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User the streams are opened for, and who publishes the post')
+        parser.add_argument('--connections', type=int, default=2000, help='Idle connections to open')
+
+    def handle(self, *args, **options):
+        if importlib.util.find_spec('uvicorn') is None:
+            raise CommandError('uvicorn is not installed: pip install uvicorn')
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'Unknown user {options["username"]!r}.')
+
+        client = Client()
+        client.force_login(user)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        port = free_port()
+        server = subprocess.Popen(server_command('uvicorn', port) + ['--limit-concurrency', '100000'], cwd=settings.BASE_DIR, env={
+            **os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'books_review.settings'),
+        })
+        try:
+            wait_until_listening(server, port)
+            self.report_page_sizes(port, cookie, user)
+            stream_token = events.token_for(user.id, client.session.session_key)
+            asyncio.run(self.run_streams(port, cookie, user, stream_token, server.pid, options['connections']))
+        finally:
+            server.terminate()
+            server.wait()
+            client.logout()
+            Ticket.objects.filter(user=user, title='bench_sse').delete()
+
+    def report_page_sizes(self, port, cookie, user):
+        _, home = request(port, 'GET', reverse('reviews:home'), cookie)
+        ticket = Ticket.objects.filter(user=user).order_by('-id').first()
+        if ticket is None:
+            return
+        _, card = request(port, 'GET', reverse('reviews:feed_card', args=['ticket', ticket.id]), cookie)
+        self.stdout.write(f'Home page {len(home):,} bytes, one pushed card {len(card):,} bytes')
+
+    async def run_streams(self, port, cookie, user, stream_token, pid, count):
+        path = f'{reverse("reviews:feed_events")}?token={stream_token}'
+        rss_before, threads_before = process_status(pid)
+        started = time.perf_counter()
+        streams = []
+        for _ in range(0, count, 100):
+            streams += await asyncio.gather(*(open_stream(port, path) for _ in range(min(100, count - len(streams)))))
+        opened = time.perf_counter() - started
+        await asyncio.sleep(1)
+        rss_after, threads_after = process_status(pid)
+        self.stdout.write(
+            f'{len(streams)} streams opened in {opened:.1f}s: server RSS {rss_before / 2 ** 20:.0f} MB '
+            f'-> {rss_after / 2 ** 20:.0f} MB ({(rss_after - rss_before) / len(streams) / 1024:.1f} kB each), '
+            f'threads {threads_before} -> {threads_after}'
+        )
+
+        # Publish through the server so that its in-process broker sees the post
+        response, form = await asyncio.to_thread(request, port, 'GET', reverse('reviews:create_ticket'), cookie)
+        csrf_cookie = re.search(r'csrftoken=([^;]+)', response.getheader('Set-Cookie', '')).group(1)
+        token = re.search(rb'name="csrfmiddlewaretoken" value="([^"]+)"', form).group(1).decode()
+        response, _ = await asyncio.to_thread(
+            request, port, 'POST', reverse('reviews:create_ticket'), f'{cookie}; csrftoken={csrf_cookie}',
+            f'title=bench_sse&description=&csrfmiddlewaretoken={token}',
+            {'Content-Type': 'application/x-www-form-urlencoded'},
+        )
+        if response.status != 302:
+            raise CommandError(f'Publishing the post failed: HTTP {response.status}')
+        published = time.perf_counter()
+        await asyncio.wait_for(asyncio.gather(*(wait_for_post(reader) for reader, _ in streams)), 60)
+        self.stdout.write(f'New post delivered to every stream in {(time.perf_counter() - published) * 1000:.0f} ms')
+        for _, writer in streams:
+            writer.close()
@@ -0,0 +1,194 @@
+import os
+import resource
+import statistics
+import tempfile
+import threading
+import time
+from io import BytesIO, RawIOBase, StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import MemoryFileUploadHandler
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from reviews.models import ImageJob
+from reviews.uploads import ImageUploadHandler
+from .bench_feed import Rollback
+
+
+def photo(megapixels):
+    """A noisy JPEG of about this many megapixels, as hard to compress as a photo"""
+    width = int((megapixels * 1e6 * 2 / 3) ** 0.5)
+    height = width * 3 // 2
+    noise = [Image.effect_noise((width, height), 40) for _ in range(3)]
+    output = BytesIO()
+    Image.merge('RGB', noise).save(output, 'JPEG', quality=90)
+    return output.getvalue()
+
+
+class MultipartStream(RawIOBase):
+    """A multipart/form-data body with one file, generated while it is read"""
+    boundary = 'BenchBoundary'
+
+    def __init__(self, size):
+        self.head = (
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="image"; filename="photo.jpg"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n'
+        ).encode() + b'\xff\xd8\xff\xe0'
+        self.tail = f'\r\n--{self.boundary}--\r\n'.encode()
+        self.length = len(self.head) + (size - 4) + len(self.tail)
+        self.position = 0
+        self.filler = bytes(range(256)) * 256
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length - self.position
+        chunks = []
+        while size > 0 and self.position < self.length:
+            body_end = self.length - len(self.tail)
+            if self.position < len(self.head):
+                chunk = self.head[self.position:self.position + size]
+            elif self.position < body_end:
+                chunk = self.filler[:min(size, body_end - self.position, len(self.filler))]
+            else:
+                offset = self.position - body_end
+                chunk = self.tail[offset:offset + size]
+            chunks.append(chunk)
+            self.position += len(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+
+def resident_bytes():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize()
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure ticket upload latency by image size, then image worker throughput (data is rolled back); '
+        'with --concurrent, measure the memory used by simultaneous uploads instead'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixels', default='0.5,2,8,24', help='Comma-separated image sizes')
+        parser.add_argument('--repeat', type=int, default=5, help='Uploads per size')
+        parser.add_argument('--processes', type=int, default=os.cpu_count(), help='Image worker processes')
+        parser.add_argument('--concurrent', type=int, default=0, help='Simultaneous uploads for the memory test')
+        parser.add_argument('--upload-mb', type=int, default=20, help='Size of each upload in the memory test')
+
+    def handle(self, *args, **options):
+        if options['concurrent']:
+            return self.memory(options['concurrent'], options['upload_mb'] * 2 ** 20)
+        sizes = [float(size) for size in options['megapixels'].split(',')]
+        with tempfile.TemporaryDirectory() as media_root:
+            # Spawned worker processes read MEDIA_ROOT from the environment
+            os.environ['MEDIA_ROOT'] = media_root
+            try:
+                with override_settings(MEDIA_ROOT=media_root), transaction.atomic():
+                    self.run(sizes, options['repeat'], options['processes'])
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def run(self, sizes, repeat, processes):
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(get_user_model().objects.create(username='bench-uploads'))
+
+        self.stdout.write(f'{"megapixels":>10} {"bytes":>12} {"request p50":>12} {"request max":>12}')
+        for megapixels in sizes:
+            data = photo(megapixels)
+            timings = []
+            for i in range(repeat):
+                upload = SimpleUploadedFile(f'photo-{i}.jpg', data, content_type='image/jpeg')
+                started = time.perf_counter()
+                client.post(reverse('reviews:create_ticket'), {'title': f'Bench {megapixels}', 'image': upload})
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f'{megapixels:>10} {len(data):>12,} {statistics.median(timings):>10.1f}ms {max(timings):>10.1f}ms'
+            )
+
+        queued = ImageJob.objects.filter(status=ImageJob.PENDING).count()
+        started = time.perf_counter()
+        call_command('run_image_worker', once=True, processes=processes, stdout=StringIO())
+        elapsed = time.perf_counter() - started
+        done = ImageJob.objects.filter(status=ImageJob.DONE).count()
+        self.stdout.write(
+            f'Worker: {done}/{queued} images in {elapsed:.1f}s '
+            f'({done / elapsed:.1f} images/s, {processes} processes)'
+        )
+
+    def memory(self, concurrent, size):
+        """Parse simultaneous uploads as the views do, sampling the process RSS"""
+        handlers = {
+            'ImageUploadHandler': lambda request: [ImageUploadHandler(request, max_size=size + 1)],
+            'in-memory buffering': lambda request: [MemoryFileUploadHandler(request)],
+        }
+        self.stdout.write(f'{concurrent} concurrent uploads of {size // 2 ** 20} MB')
+        self.stdout.write(f'{"handler":<22} {"RSS before":>12} {"peak RSS":>12} {"growth":>10} {"seconds":>8}')
+        for label, make_handlers in handlers.items():
+            with override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=2 * size):
+                before = resident_bytes()
+                peak, elapsed = self.parse_concurrently(concurrent, size, make_handlers)
+            self.stdout.write(
+                f'{label:<22} {before / 2 ** 20:>10.0f}MB {peak / 2 ** 20:>10.0f}MB '
+                f'{(peak - before) / 2 ** 20:>8.0f}MB {elapsed:>8.1f}'
+            )
+
+    def parse_concurrently(self, concurrent, size, make_handlers):
+        barrier = threading.Barrier(concurrent + 1)
+        finished = threading.Event()
+        peak = [resident_bytes()]
+
+        def sample():
+            while not finished.wait(0.005):
+                peak[0] = max(peak[0], resident_bytes())
+
+        def upload():
+            body = MultipartStream(size)
+            request = WSGIRequest({
+                'REQUEST_METHOD': 'POST', 'PATH_INFO': '/tickets/create/',
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'wsgi.url_scheme': 'http',
+                'CONTENT_TYPE': f'multipart/form-data; boundary={body.boundary}',
+                'CONTENT_LENGTH': str(body.length), 'wsgi.input': body,
+            })
+            request.upload_handlers = make_handlers(request)
+            barrier.wait()
+            try:
+                uploaded = request.FILES['image']
+                assert uploaded.size == size, uploaded.size
+            except BaseException:
+                barrier.abort()
+                raise
+            # Hold the file until every upload has been parsed, as slow views would
+            barrier.wait()
+            uploaded.close()
+
+        sampler = threading.Thread(target=sample)
+        threads = [threading.Thread(target=upload) for _ in range(concurrent)]
+        sampler.start()
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        barrier.wait()
+        elapsed = time.perf_counter() - started
+        for thread in threads:
+            thread.join()
+        finished.set()
+        sampler.join()
+        return max(peak[0], resident_bytes()), elapsed
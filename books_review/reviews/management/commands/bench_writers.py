@@ -0,0 +1,117 @@
+import statistics
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+
+from reviews.models import Review, Ticket, UserFollows
+from reviews.timeline import get_timeline_page
+
+PREFIX = 'bench-writer'
+
+
+class Command(BaseCommand):
+    help = 'Post reviews from parallel writers, with readers loading a feed, against the configured database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Concurrent writer threads, one connection each')
+        parser.add_argument('--reviews', type=int, default=100, help='Reviews posted by each writer')
+        parser.add_argument('--readers', type=int, default=4, help='Threads reading a home feed meanwhile')
+
+    def handle(self, *args, **options):
+        writers, per_writer = options['writers'], options['reviews']
+        User = get_user_model()
+        if User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError(f'Users named {PREFIX}* exist already: delete them first.')
+
+        author = User.objects.create(username=f'{PREFIX}-author')
+        users = User.objects.bulk_create([User(username=f'{PREFIX}-{i}') for i in range(writers)])
+        reader = User.objects.create(username=f'{PREFIX}-reader')
+        UserFollows.objects.bulk_create([
+            UserFollows(user=reader, followed_user=user, follower_username=reader.username, followed_username=user.username)
+            for user in users
+        ])
+        tickets = [Ticket.objects.create(title=f'{PREFIX} {i}', user=author) for i in range(per_writer)]
+        latencies, errors, reads = [], [], []
+        lock = threading.Lock()
+        start = threading.Barrier(writers + options['readers'])
+        writing = threading.Event()
+        writing.set()
+
+        def read():
+            mine, failed = [], []
+            start.wait()
+            try:
+                while writing.is_set():
+                    began = time.perf_counter()
+                    try:
+                        get_timeline_page(reader)
+                    except OperationalError as error:
+                        failed.append(str(error))
+                    else:
+                        mine.append(time.perf_counter() - began)
+            finally:
+                connection.close()
+                with lock:
+                    reads.extend(mine)
+                    errors.extend(failed)
+
+        def write(user):
+            mine, failed = [], []
+            start.wait()
+            try:
+                for ticket in tickets:
+                    began = time.perf_counter()
+                    try:
+                        # Saving a review also writes the timelines, the
+                        # ticket statistics and the search index
+                        with transaction.atomic():
+                            Review.objects.create(ticket=ticket, user=user, rating=4, headline=PREFIX)
+                    except OperationalError as error:
+                        failed.append(str(error))
+                    else:
+                        mine.append(time.perf_counter() - began)
+            finally:
+                connection.close()
+                with lock:
+                    latencies.extend(mine)
+                    errors.extend(failed)
+
+        threads = [threading.Thread(target=write, args=(user,)) for user in users]
+        readers = [threading.Thread(target=read) for _ in range(options['readers'])]
+        began = time.perf_counter()
+        for thread in threads + readers:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+        writing.clear()
+        for thread in readers:
+            thread.join()
+
+        try:
+            settings = connection.settings_dict
+            self.stdout.write(
+                f'{connection.vendor}, CONN_MAX_AGE={settings["CONN_MAX_AGE"]}, '
+                f'{writers} writers x {per_writer} reviews in {elapsed:.2f}s'
+            )
+            if latencies:
+                latencies.sort()
+                self.stdout.write(
+                    f'{len(latencies) / elapsed:.1f} reviews/s, latency p50 {statistics.median(latencies) * 1000:.1f} ms, '
+                    f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms, '
+                    f'max {latencies[-1] * 1000:.1f} ms'
+                )
+            if reads:
+                reads.sort()
+                self.stdout.write(
+                    f'{len(reads) / elapsed:.1f} feed reads/s meanwhile, p50 {statistics.median(reads) * 1000:.1f} ms, '
+                    f'p95 {reads[int(len(reads) * 0.95)] * 1000:.1f} ms'
+                )
+            self.stdout.write(f'{len(errors)} failed query(ies)' + (f': {errors[0]}' if errors else ''))
+        finally:
+            # Reviews go with their tickets
+            Ticket.objects.filter(user=author).delete()
+            User.objects.filter(username__startswith=PREFIX).delete()
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from reviews import images, jobs
+from reviews.models import Ticket
+
+
+class Command(BaseCommand):
+    help = 'Queue the ticket images whose renditions are missing (processed by run_image_worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Also queue images whose renditions are up to date')
+
+    def handle(self, *args, **options):
+        queued = 0
+        for ticket in Ticket.objects.exclude(image='').exclude(image=None).order_by('id').iterator():
+            if options['force'] or not images.is_current(ticket):
+                jobs.enqueue(ticket)
+                queued += 1
+        self.stdout.write(self.style.SUCCESS(f'{queued} image(s) queued.'))
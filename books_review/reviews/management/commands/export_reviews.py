@@ -0,0 +1,32 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from reviews.transfer import CHUNK_SIZE, export_records
+
+
+class Command(BaseCommand):
+    help = 'Export every ticket and review as JSON Lines, for import_reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help='File to write, - for standard output')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows fetched per query')
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            output = self.stdout
+        else:
+            output = open(options['output'], 'w', encoding='utf-8')
+        began = time.perf_counter()
+        count = 0
+        try:
+            for record in export_records(chunk_size=options['chunk_size']):
+                output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                count += 1
+        finally:
+            if output is not self.stdout:
+                output.close()
+        elapsed = time.perf_counter() - began
+        # Standard output may carry the records
+        self.stderr.write(f'{count} record(s) exported in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} records/s).')
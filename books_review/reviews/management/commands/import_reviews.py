@@ -0,0 +1,41 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from reviews.transfer import BATCH_SIZE, Importer
+
+
+class Command(BaseCommand):
+    help = 'Import tickets and reviews from a JSON Lines file (see reviews.transfer)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to read, - for standard input')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Records inserted per transaction')
+
+    def handle(self, *args, **options):
+        importer = Importer(batch_size=options['batch_size'], on_skip=self.report_skip)
+        source = sys.stdin if options['path'] == '-' else open(options['path'], encoding='utf-8')
+        began = time.perf_counter()
+        lines = 0
+        with source:
+            for lines, line in enumerate(source, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as error:
+                    importer.skip(lines, f'invalid JSON: {error}')
+                    continue
+                importer.add(lines, record)
+        counts = importer.finish()
+        elapsed = time.perf_counter() - began
+        self.stdout.write(self.style.SUCCESS(
+            f'{counts["tickets"]} ticket(s) and {counts["reviews"]} review(s) imported, '
+            f'{counts["users"]} user(s) created, {counts["skipped"]} record(s) skipped; '
+            f'{lines} line(s) in {elapsed:.1f}s ({lines / max(elapsed, 1e-9):.0f} records/s).'
+        ))
+
+    def report_skip(self, line_number, reason):
+        self.stderr.write(f'Line {line_number} skipped: {reason}')
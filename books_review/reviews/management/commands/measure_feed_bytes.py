@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from reviews.timeline import get_timeline_page
+
+
+def chosen_rendition(renditions, pixels):
+    """The WebP rendition a browser picks from the srcset for a slot of this many pixels"""
+    candidates = renditions.get('webp', [])
+    return next((name for width, name in candidates if width >= pixels), candidates[-1][1] if candidates else None)
+
+
+class Command(BaseCommand):
+    help = 'Compare the image bytes of home feed pages served as originals and as renditions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--pages', type=int, default=1, help='Number of feed pages to walk')
+        parser.add_argument('--slot-width', type=int, default=320, help='Displayed image width in CSS pixels')
+        parser.add_argument('--dpr', type=float, default=2, help='Device pixel ratio')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'Unknown user {options["username"]!r}.')
+        pixels = options['slot_width'] * options['dpr']
+
+        self.stdout.write(f'{"page":>4} {"images":>7} {"originals":>12} {"renditions":>12} {"saved":>7}')
+        cursor = None
+        for page in range(1, options['pages'] + 1):
+            items, cursor = get_timeline_page(user, cursor)
+            tickets = [item['object'] if item['type'] == 'ticket' else item['object'].ticket for item in items]
+            tickets = [ticket for ticket in tickets if ticket.image]
+            original = derived = 0
+            for ticket in tickets:
+                size = ticket.image.storage.size(ticket.image.name)
+                original += size
+                name = chosen_rendition(ticket.image_renditions, pixels)
+                derived += ticket.image.storage.size(name) if name else size
+            saved = 1 - derived / original if original else 0
+            self.stdout.write(f'{page:>4} {len(tickets):>7} {original:>12,} {derived:>12,} {saved:>7.0%}')
+            if cursor is None:
+                break
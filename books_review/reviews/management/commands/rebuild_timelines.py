@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from reviews import timeline
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized home timelines from tickets, reviews and follows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Only rebuild these users (default: everyone)')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        count = 0
+        for user in users.iterator():
+            with transaction.atomic():
+                timeline.rebuild(user)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'{count} timeline(s) rebuilt.'))
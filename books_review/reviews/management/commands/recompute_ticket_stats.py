@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from reviews import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the review statistics stored on tickets and repair any drift'
+
+    def handle(self, *args, **options):
+        repaired = stats.recompute()
+        self.stdout.write(self.style.SUCCESS(f'{repaired} ticket(s) repaired.'))
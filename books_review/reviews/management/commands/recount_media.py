@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from reviews import media
+
+
+class Command(BaseCommand):
+    help = 'Recompute the reference counts of stored media files and delete the unreferenced ones'
+
+    def handle(self, *args, **options):
+        deleted = media.recount()
+        self.stdout.write(self.style.SUCCESS(f'{len(deleted)} unreferenced file(s) deleted.'))
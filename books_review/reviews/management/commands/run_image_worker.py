@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from reviews import images, jobs
+
+
+class InlineExecutor:
+    """Runs the jobs in the worker's own process (--processes 0)"""
+
+    def submit(self, function, *args):
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Validate, clean and resize queued ticket images in a pool of processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Worker processes (0 runs the jobs in this process)'
+        )
+        parser.add_argument('--batch-size', type=int, default=None, help='Jobs claimed at once (default: 2 per process)')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        batch_size = options['batch_size'] or max(processes, 1) * 2
+        if processes:
+            # spawn: the children must not inherit the parent's database connections
+            executor = ProcessPoolExecutor(
+                processes, mp_context=multiprocessing.get_context('spawn'), initializer=images.init_worker_process
+            )
+        else:
+            executor = InlineExecutor()
+
+        done = failed = 0
+        started = time.perf_counter()
+        try:
+            while True:
+                jobs.requeue_stale()
+                batch = jobs.claim(batch_size)
+                if not batch:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+                futures = [(job, executor.submit(images.process, job.source)) for job in batch]
+                for job, future in futures:
+                    try:
+                        clean_name, renditions = future.result()
+                    except Exception as error:
+                        jobs.fail(job, error)
+                        failed += 1
+                        self.stderr.write(f'{job.source}: {job.error}')
+                    else:
+                        jobs.complete(job, clean_name, renditions)
+                        done += 1
+        except KeyboardInterrupt:
+            pass
+        finally:
+            executor.shutdown(wait=True)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{done} image(s) processed, {failed} failed in {elapsed:.1f}s.'
+        ))
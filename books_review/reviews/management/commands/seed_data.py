@@ -0,0 +1,181 @@
+import random
+import time
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from authentication import lookups
+from reviews import follows
+from reviews.models import Ticket, UserFollows
+from reviews.transfer import Importer
+from .bench_search import vocabulary
+
+PASSWORD = 'seed-pass-123'
+SPAN = timedelta(days=365)
+
+
+def jpeg(rng, width=900, height=1350):
+    """A cover-sized JPEG: two colour bands, so that renditions are not trivial"""
+    image = Image.new('RGB', (width, height), tuple(rng.randrange(256) for _ in range(3)))
+    image.paste(tuple(rng.randrange(256) for _ in range(3)), (0, height // 3, width, height // 2))
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = 'Seed users with a power-law follow graph, tickets, reviews and ticket images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--follows', type=float, default=20, help='Mean number of users each user follows')
+        parser.add_argument(
+            '--exponent', type=float, default=2.1,
+            help='Exponent of the power law of follower counts: a few users are followed by many'
+        )
+        parser.add_argument('--tickets', type=float, default=5, help='Mean tickets per user')
+        parser.add_argument('--reviews', type=float, default=10, help='Mean reviews per user')
+        parser.add_argument('--images', type=float, default=0.1, help='Share of tickets with an image')
+        parser.add_argument('--prefix', default='seed', help='Usernames are <prefix>-<number>')
+        parser.add_argument('--password', default=PASSWORD, help='Password of every seeded user')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, for reproducible datasets')
+        parser.add_argument('--flush', action='store_true', help='Delete the users of a previous run first')
+        parser.add_argument('--no-worker', action='store_true', help='Leave the image jobs queued')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        previous = User.objects.filter(username__startswith=f'{options["prefix"]}-')
+        if previous.exists():
+            if not options['flush']:
+                raise CommandError(f'Users named {options["prefix"]}-* exist already: use --flush to replace them.')
+            # Their posts, follows and timelines go with them
+            previous.delete()
+        if options['exponent'] <= 1:
+            raise CommandError('--exponent must be greater than 1.')
+
+        rng = random.Random(options['seed'])
+        self.now = timezone.now()
+        began = time.perf_counter()
+        usernames = [f'{options["prefix"]}-{number}' for number in range(options['users'])]
+        # Hashing once keeps seeding fast; every user gets the same password
+        password = make_password(options['password'])
+        users = User.objects.bulk_create([User(username=username, password=password) for username in usernames])
+        # bulk_create sends no post_save: drop the cached misses by hand
+        lookups.forget(*usernames)
+        user_ids = [user.id for user in users]
+
+        # Follower counts follow a power law: the i-th most popular user is
+        # chosen with a weight of i ** -(1 / (exponent - 1)), a Zipf law
+        popularity = list(range(len(users)))
+        rng.shuffle(popularity)
+        cum_weights = list(accumulate(rank ** (-1 / (options['exponent'] - 1)) for rank in range(1, len(users) + 1)))
+        followed = self.follow_graph(rng, popularity, cum_weights, options['follows'])
+        with transaction.atomic():
+            UserFollows.objects.bulk_create(
+                [UserFollows(user_id=user_ids[user], followed_user_id=user_ids[other],
+                             follower_username=usernames[user], followed_username=usernames[other])
+                 for user, others in enumerate(followed) for other in others],
+                batch_size=2000,
+            )
+            follows.forget(user_ids)
+            follows.recount(user_ids)
+
+        importer = Importer()
+        for number, record in enumerate(self.posts(rng, usernames, followed, popularity, cum_weights, options), 1):
+            importer.add(number, record)
+        counts = importer.finish()
+
+        images = self.add_images(rng, user_ids, options['images'])
+        if images and not options['no_worker']:
+            call_command('run_image_worker', once=True, processes=0, stdout=self.stdout, stderr=self.stderr)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(users)} users, {sum(len(others) for others in followed)} follows, {counts["tickets"]} tickets, '
+            f'{counts["reviews"]} reviews and {images} images seeded in {time.perf_counter() - began:.1f}s. '
+            f'Log in as {usernames[popularity[0]]} (the most followed user) with password {options["password"]!r}.'
+        ))
+
+    def follow_graph(self, rng, popularity, cum_weights, mean):
+        """Users followed by each user, as indexes into the user list"""
+        followed = []
+        for user in range(len(popularity)):
+            # Most users follow a few others, some follow many
+            count = min(int(rng.expovariate(1 / mean)) if mean else 0, len(popularity) - 1)
+            others = set()
+            while len(others) < count:
+                others.update(
+                    other for other in
+                    (popularity[rank] for rank in rng.choices(range(len(popularity)), cum_weights=cum_weights, k=count))
+                    if other != user
+                )
+            followed.append(sorted(others)[:count])
+        return followed
+
+    def time_created(self, key):
+        # Spread over the last year, the same for a key whatever the seed
+        return self.now - timedelta(seconds=(key * 2654435761) % int(SPAN.total_seconds()))
+
+    def posts(self, rng, usernames, followed, popularity, cum_weights, options):
+        """Ticket records, then review records, in the format of reviews.transfer"""
+        words, word_weights = vocabulary(rng, 5000)
+
+        def text(count):
+            return ' '.join(rng.choices(words, cum_weights=word_weights, k=count))
+
+        tickets_of = []
+        next_key = 0
+        for username in usernames:
+            count = int(rng.expovariate(1 / options['tickets'])) if options['tickets'] else 0
+            tickets_of.append(range(next_key, next_key + count))
+            next_key += count
+            for key in tickets_of[-1]:
+                yield {
+                    'type': 'ticket', 'id': key, 'user': username, 'title': text(rng.randint(2, 6)).capitalize(),
+                    'description': text(rng.randint(0, 40)), 'time_created': self.time_created(key).isoformat(),
+                }
+
+        for user, username in enumerate(usernames):
+            count = int(rng.expovariate(1 / options['reviews'])) if options['reviews'] else 0
+            reviewed = set()
+            # Some draws hit a user without tickets, or a ticket reviewed already
+            for _ in range(count * 5):
+                if len(reviewed) == count:
+                    break
+                # Mostly tickets of followed users, otherwise of popular ones
+                if followed[user] and rng.random() < 0.8:
+                    author = rng.choice(followed[user])
+                else:
+                    author = popularity[rng.choices(range(len(popularity)), cum_weights=cum_weights)[0]]
+                if not tickets_of[author]:
+                    continue
+                ticket = rng.choice(tickets_of[author])
+                if ticket in reviewed:
+                    continue
+                reviewed.add(ticket)
+                time_created = min(self.time_created(ticket) + timedelta(days=rng.uniform(0, 30)), self.now)
+                yield {
+                    'type': 'review', 'ticket': ticket, 'user': username,
+                    # Ratings lean positive, as on most review sites
+                    'rating': rng.choice([0, 1, 2, 3, 3, 4, 4, 4, 5, 5]),
+                    'headline': text(rng.randint(2, 6)).capitalize(), 'body': text(rng.randint(0, 120)),
+                    'time_created': time_created.isoformat(),
+                }
+
+    def add_images(self, rng, user_ids, share):
+        """Attach images to a share of the tickets; the image worker then processes them"""
+        tickets = list(Ticket.objects.filter(user_id__in=user_ids).order_by('id'))
+        tickets = rng.sample(tickets, int(len(tickets) * share))
+        # Covers repeat across tickets, which the content-addressed storage shares
+        covers = [jpeg(rng) for _ in range(min(len(tickets), 20))]
+        for ticket in tickets:
+            ticket.image.save('cover.jpg', ContentFile(rng.choice(covers)))
+        return len(tickets)
@@ -0,0 +1,113 @@
+"""Reference counts of stored media files.
+
+With content-addressed storage (reviews.storage) several tickets can point
+to the same file, so a file is only deleted once nothing references it. A
+MediaBlob row counts the references to one file name:
+
+- a ticket references its image and each of its renditions,
+- a pending or running ImageJob references its source upload.
+
+Counts change with single UPDATE ... SET references = references ± n
+statements; ``recount_media`` recomputes them from the tables and removes
+the files left without references.
+
+A save that finds its content already stored returns the existing name,
+and the caller references it later (when its ticket is saved). Meanwhile
+the last previous reference may go away: ``saved`` marks the blob, and
+``collect`` leaves a blob saved within MEDIA_COLLECT_GRACE_SECONDS alone
+until a reference clears the mark. The image worker's saves are not marked
+(its processes stay off the database): ``jobs.complete`` references the
+files first and checks they are still there. ``collect`` locks the row while it
+deletes, so a save either waits for the deletion (and writes the file
+again) or marks the blob first.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import ImageJob, MediaBlob, Ticket
+
+
+def rendition_names(renditions):
+    return [name for extension in ('webp', 'jpeg') for _, name in renditions.get(extension, [])]
+
+
+def ticket_files(image_name, renditions):
+    """Every file a ticket references"""
+    return [image_name, *rendition_names(renditions)]
+
+
+def _by_count(names):
+    """Group names by how many times they occur: {count: [name, ...]}"""
+    groups = defaultdict(list)
+    for name, count in Counter(name for name in names if name).items():
+        groups[count].append(name)
+    return groups
+
+
+def acquire(names):
+    """Add one reference to each name (names may repeat)"""
+    groups = _by_count(names)
+    if not groups:
+        return
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name) for group in groups.values() for name in group], ignore_conflicts=True
+    )
+    for count, group in groups.items():
+        MediaBlob.objects.filter(name__in=group).update(references=F('references') + count, saved=None)
+
+
+def saved(name):
+    """Mark name as just saved, before it is referenced"""
+    if not MediaBlob.objects.filter(name=name).update(saved=timezone.now()):
+        MediaBlob.objects.bulk_create([MediaBlob(name=name, saved=timezone.now())], ignore_conflicts=True)
+
+
+def release(names, storage=default_storage):
+    """Drop one reference to each name and delete the files left unreferenced"""
+    groups = _by_count(names)
+    for count, group in groups.items():
+        MediaBlob.objects.filter(name__in=group).update(references=Greatest(F('references') - count, 0))
+    collect([name for group in groups.values() for name in group], storage)
+
+
+def collect(names, storage=default_storage):
+    """Delete the files among names that nothing references"""
+    recent = timezone.now() - timedelta(seconds=settings.MEDIA_COLLECT_GRACE_SECONDS)
+    for name in set(filter(None, names)):
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            if blob is not None:
+                if blob.references or (blob.saved and blob.saved > recent):
+                    continue
+                blob.delete()
+            # Rows created without signals (bulk_create) are not counted
+            elif Ticket.objects.filter(image=name).exists():
+                continue
+            storage.delete(name)
+
+
+def recount(storage=default_storage):
+    """Recompute every reference count; return the names of the files deleted"""
+    counts = Counter()
+    for image, renditions in Ticket.objects.exclude(image='').exclude(image=None).values_list(
+        'image', 'image_renditions'
+    ).iterator():
+        counts.update(ticket_files(image, renditions))
+    counts.update(
+        ImageJob.objects.filter(status__in=[ImageJob.PENDING, ImageJob.RUNNING]).values_list('source', flat=True)
+    )
+    MediaBlob.objects.exclude(name__in=counts).update(references=0)
+    MediaBlob.objects.bulk_create([MediaBlob(name=name) for name in counts], ignore_conflicts=True)
+    for name, count in counts.items():
+        MediaBlob.objects.filter(name=name).exclude(references=count).update(references=count)
+
+    orphans = list(MediaBlob.objects.filter(references=0).values_list('name', flat=True))
+    collect(orphans, storage)
+    return orphans
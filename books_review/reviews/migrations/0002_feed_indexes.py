@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['-time_created', '-id'], name='review_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['-time_created', '-id'], name='ticket_feed_idx'),
+        ),
+    ]
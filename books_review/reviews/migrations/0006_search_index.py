@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Ticket = apps.get_model('reviews', 'Ticket')
+    Review = apps.get_model('reviews', 'Review')
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE reviews_search USING fts5("
+        "title, body, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    insert = 'INSERT INTO reviews_search (rowid, title, body) VALUES (%s, %s, %s)'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(insert, [
+            (ticket.id * 2, ticket.title, ticket.description)
+            for ticket in Ticket.objects.order_by().iterator()
+        ])
+        cursor.executemany(insert, [
+            (review.id * 2 + 1, review.headline, review.body)
+            for review in Review.objects.order_by().iterator()
+        ])
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS reviews_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0005_ticket_review_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
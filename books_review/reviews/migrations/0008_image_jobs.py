@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0007_ticket_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('done', 'Terminé'), ('failed', 'Échec')], default='pending', max_length=7)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('time_created', models.DateTimeField(auto_now_add=True)),
+                ('time_updated', models.DateTimeField(auto_now=True)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_jobs', to='reviews.ticket')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='imagejob_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:26
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    Ticket = apps.get_model('reviews', 'Ticket')
+    ImageJob = apps.get_model('reviews', 'ImageJob')
+    MediaBlob = apps.get_model('reviews', 'MediaBlob')
+    counts = Counter()
+    for image, renditions in Ticket.objects.exclude(image='').exclude(image=None).values_list(
+        'image', 'image_renditions'
+    ).iterator():
+        counts[image] += 1
+        counts.update(name for extension in ('webp', 'jpeg') for _, name in renditions.get(extension, []))
+    counts.update(ImageJob.objects.filter(status__in=['pending', 'running']).values_list('source', flat=True))
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name, references=count) for name, count in counts.items()], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0008_image_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('references', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
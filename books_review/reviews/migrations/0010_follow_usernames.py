@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:45
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_usernames(apps, schema_editor):
+    User = apps.get_model('authentication', 'User')
+    UserFollows = apps.get_model('reviews', 'UserFollows')
+    UserFollows.objects.update(
+        follower_username=Subquery(User.objects.filter(pk=OuterRef('user_id')).values('username')),
+        followed_username=Subquery(User.objects.filter(pk=OuterRef('followed_user_id')).values('username')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_follow_counts'),
+        ('reviews', '0009_media_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userfollows',
+            name='followed_username',
+            field=models.CharField(default='', editable=False, max_length=150),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='userfollows',
+            name='follower_username',
+            field=models.CharField(default='', editable=False, max_length=150),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_usernames, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='userfollows',
+            index=models.Index(fields=['followed_user', 'follower_username'], name='follows_followers_page_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userfollows',
+            index=models.Index(fields=['user', 'followed_username'], name='follows_following_page_idx'),
+        ),
+    ]
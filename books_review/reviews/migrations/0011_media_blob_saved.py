@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0010_follow_usernames'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediablob',
+            name='saved',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
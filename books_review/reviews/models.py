@@ -8,13 +8,48 @@ class Ticket(models.Model):
     description = models.TextField(max_length=2048, blank=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     image = models.ImageField(upload_to='ticket_images/', null=True, blank=True)
+    # Resized copies of the image, written by reviews.images
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     time_created = models.DateTimeField(auto_now_add=True)
 
+    # Review statistics, maintained incrementally by reviews.stats
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_0 = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return self.title
 
+    @property
+    def avg_rating(self):
+        if not self.review_count:
+            return None
+        return self.rating_sum / self.review_count
+
+    @property
+    def rating_histogram(self):
+        """Number of reviews for each rating, from 0 to 5"""
+        return [getattr(self, f'rating_{rating}') for rating in range(6)]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored image so a replacement can release the old file
+        if 'image' in field_names:
+            instance._loaded_image = instance.image.name or ''
+        return instance
+
     class Meta:
         ordering = ['-time_created']
+        indexes = [
+            models.Index(fields=['-time_created', '-id'], name='ticket_feed_idx'),
+            models.Index(fields=['user', '-time_created', '-id'], name='ticket_user_feed_idx'),
+        ]
 
 
 class Review(models.Model):
@@ -30,16 +65,111 @@ class Review(models.Model):
     def __str__(self):
         return f"{self.headline} - {self.ticket.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored rating so an edit can adjust the ticket statistics
+        if 'rating' in field_names:
+            instance._loaded_rating = instance.rating
+        return instance
+
     class Meta:
         ordering = ['-time_created']
+        indexes = [
+            models.Index(fields=['-time_created', '-id'], name='review_feed_idx'),
+            models.Index(fields=['user', '-time_created', '-id'], name='review_user_feed_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['ticket', 'user'], name='unique_review_per_user'),
+        ]
 
 
 class UserFollows(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='following')
     followed_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='followed_by')
+    # Copies of the usernames, so that follow lists are read in username
+    # order from an index (reviews.follows keeps them up to date on renames)
+    follower_username = models.CharField(max_length=150, editable=False)
+    followed_username = models.CharField(max_length=150, editable=False)
 
     class Meta:
         unique_together = ('user', 'followed_user')
+        indexes = [
+            models.Index(fields=['followed_user', 'user'], name='follows_followed_idx'),
+            models.Index(fields=['followed_user', 'follower_username'], name='follows_followers_page_idx'),
+            models.Index(fields=['user', 'followed_username'], name='follows_following_page_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.follower_username:
+            self.follower_username = self.user.username
+        if not self.followed_username:
+            self.followed_username = self.followed_user.username
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.user.username} follows {self.followed_user.username}"
+
+
+class TimelineEntry(models.Model):
+    """A post materialized in the home feed of one user (fan-out on write)"""
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline_entries')
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    review = models.ForeignKey(Review, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    post_type = models.CharField(max_length=6)
+    post_id = models.PositiveBigIntegerField()
+    time_created = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'post_type', 'post_id'], name='unique_timeline_post'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-time_created', '-post_id', '-post_type'], name='timeline_page_idx'),
+            models.Index(fields=['owner', 'author'], name='timeline_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.post_type} {self.post_id} in {self.owner_id}'s timeline"
+
+
+class ImageJob(models.Model):
+    """A ticket image waiting to be validated, cleaned and resized by run_image_worker"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'En attente'),
+        (RUNNING, 'En cours'),
+        (DONE, 'Terminé'),
+        (FAILED, 'Échec'),
+    ]
+
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='image_jobs')
+    source = models.CharField(max_length=255)
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    time_created = models.DateTimeField(auto_now_add=True)
+    time_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='imagejob_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.source} ({self.status})"
+
+
+class MediaBlob(models.Model):
+    """A stored file and the number of rows pointing to it, kept by reviews.media"""
+    name = models.CharField(max_length=255, primary_key=True)
+    references = models.PositiveIntegerField(default=0)
+    # Set when the file is saved, cleared once it is referenced: see reviews.media.collect
+    saved = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.references})"
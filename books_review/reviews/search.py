@@ -0,0 +1,138 @@
+"""Full-text search over tickets and reviews.
+
+On SQLite the posts are indexed in the ``reviews_search`` FTS5 table
+(created by migration 0006) and results are ranked with bm25. The row id
+encodes the post: ``id * 2`` for a ticket, ``id * 2 + 1`` for a review, so
+keeping the index in sync is a primary-key write. Other databases fall back
+to ``LIKE`` matching, newest first.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .feed import PAGE_SIZE, hydrate, merged_keys
+from .models import Ticket, Review
+
+TABLE = 'reviews_search'
+TYPES = ('ticket', 'review')
+# Title/headline matches weigh more than description/body matches
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+MAX_QUERY_TERMS = 16
+# Deeper pages are clamped: the OFFSET must fit in 64 bits, and nobody reads that far
+MAX_PAGE = 500
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def _rowid(post_type, post_id):
+    return post_id * 2 + TYPES.index(post_type)
+
+
+def _columns(post_type, post):
+    if post_type == 'ticket':
+        return post.title, post.description
+    return post.headline, post.body
+
+
+def index(post_type, post):
+    """Add or refresh a post in the search index"""
+    if not fts_enabled():
+        return
+    rowid = _rowid(post_type, post.id)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, title, body) VALUES (%s, %s, %s)',
+            [rowid, *_columns(post_type, post)],
+        )
+
+
+def index_many(post_type, posts):
+    """index() for posts created in bulk"""
+    if not fts_enabled():
+        return
+    rows = [(_rowid(post_type, post.id), *_columns(post_type, post)) for post in posts]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(f'INSERT INTO {TABLE} (rowid, title, body) VALUES (%s, %s, %s)', rows)
+
+
+def unindex(post_type, post_id):
+    """Remove a post from the search index"""
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [_rowid(post_type, post_id)])
+
+
+def rebuild():
+    """Re-index every ticket and review"""
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        for post_type, queryset in (('ticket', Ticket.objects.all()), ('review', Review.objects.all())):
+            rows = (
+                (_rowid(post_type, post.id), *_columns(post_type, post))
+                for post in queryset.order_by().iterator(chunk_size=2000)
+            )
+            cursor.executemany(f'INSERT INTO {TABLE} (rowid, title, body) VALUES (%s, %s, %s)', rows)
+        # Merge the index segments written by the bulk insert
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+
+
+def terms(query):
+    return re.findall(r'\w+', query)[:MAX_QUERY_TERMS]
+
+
+def match_expression(query):
+    """Turn user input into an FTS5 query: every term must match, the last one as a prefix"""
+    quoted = [f'"{term}"' for term in terms(query)]
+    if not quoted:
+        return ''
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def fts_search(query, page=1, page_size=PAGE_SIZE):
+    """Return (rows, has_next) for a page of bm25-ranked results"""
+    expression = match_expression(query)
+    if not expression:
+        return [], False
+    # Ordering by the rank column lets FTS5 keep only the best page_size + 1
+    # + offset matches while it scores every one of them with bm25
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s AND rank MATCH %s '
+            f'ORDER BY rank LIMIT %s OFFSET %s',
+            [expression, f'bm25({TITLE_WEIGHT}, {BODY_WEIGHT})', page_size + 1, (page - 1) * page_size],
+        )
+        rowids = [rowid for rowid, in cursor.fetchall()]
+    rows = [(None, TYPES[rowid % 2], rowid // 2) for rowid in rowids[:page_size]]
+    return rows, len(rowids) > page_size
+
+
+def like_search(query, page=1, page_size=PAGE_SIZE):
+    """Return (rows, has_next) for a page of LIKE matches, newest first"""
+    words = terms(query)
+    if not words:
+        return [], False
+    ticket_filter, review_filter = Q(), Q()
+    for word in words:
+        ticket_filter &= Q(title__icontains=word) | Q(description__icontains=word)
+        review_filter &= Q(headline__icontains=word) | Q(body__icontains=word)
+    keys = merged_keys(Ticket.objects.filter(ticket_filter), Review.objects.filter(review_filter))
+    offset = (page - 1) * page_size
+    rows = list(keys[offset:offset + page_size + 1])
+    return rows[:page_size], len(rows) > page_size
+
+
+def search_posts(query, page=1, page_size=PAGE_SIZE, viewer=None):
+    """Return (items, has_next) for one page of results, as feed items"""
+    find = fts_search if fts_enabled() else like_search
+    rows, has_next = find(query, page, page_size)
+    return hydrate(rows, viewer), has_next
@@ -0,0 +1,144 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from authentication.models import User
+from . import cards, events, follows, images, jobs, media, search, stats, timeline
+from .models import ImageJob, Ticket, Review, UserFollows
+
+
+@receiver(post_save, sender=Ticket)
+def fan_out_ticket(sender, instance, created, raw=False, **kwargs):
+    """Publish a new ticket to the timelines of its audience"""
+    if created and not raw:
+        events.post_created('ticket', instance.id, timeline.fan_out('ticket', instance))
+
+
+@receiver(post_save, sender=Review)
+def fan_out_review(sender, instance, created, raw=False, **kwargs):
+    """Publish a new review to the timelines of its audience"""
+    if created and not raw:
+        events.post_created('review', instance.id, timeline.fan_out('review', instance))
+
+
+@receiver(post_save, sender=UserFollows)
+def backfill_followed_posts(sender, instance, created, raw=False, **kwargs):
+    """Bring the posts of a newly followed user into the follower's timeline"""
+    if created and not raw:
+        timeline.follow(instance.user_id, instance.followed_user_id)
+
+
+@receiver(post_delete, sender=UserFollows)
+def remove_unfollowed_posts(sender, instance, **kwargs):
+    """Drop the posts of an unfollowed user from the follower's timeline"""
+    timeline.unfollow(instance.user_id, instance.followed_user_id)
+
+
+@receiver([post_save, post_delete], sender=UserFollows)
+def invalidate_follow_lists(sender, instance, **kwargs):
+    follows.follow_changed(instance.user_id, instance.followed_user_id)
+
+
+@receiver(post_save, sender=UserFollows)
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        follows.count_follow(instance.user_id, instance.followed_user_id, 1)
+
+
+@receiver(post_delete, sender=UserFollows)
+def count_removed_follow(sender, instance, **kwargs):
+    follows.count_follow(instance.user_id, instance.followed_user_id, -1)
+
+
+@receiver(post_save, sender=User)
+def invalidate_renamed_user(sender, instance, created, raw=False, **kwargs):
+    """Refresh the follow lists and review cards that show a renamed user"""
+    if not created and getattr(instance, '_loaded_username', instance.username) != instance.username:
+        follows.user_renamed(instance.id, instance.username)
+        cards.bump('user', instance.id)
+
+
+@receiver(post_save, sender=Review)
+def update_ticket_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    """Count a new review, or move an edited review to its new rating"""
+    if raw:
+        return
+    if created:
+        stats.review_added(instance.ticket_id, instance.rating)
+    elif hasattr(instance, '_loaded_rating'):
+        stats.rating_changed(instance.ticket_id, instance._loaded_rating, instance.rating)
+    instance._loaded_rating = instance.rating
+
+
+@receiver(post_delete, sender=Review)
+def update_ticket_stats_on_delete(sender, instance, origin=None, **kwargs):
+    """Uncount a deleted review, unless its ticket is being deleted with it"""
+    if isinstance(origin, Ticket) and origin.pk == instance.ticket_id:
+        return
+    stats.review_removed(instance.ticket_id, instance.rating)
+
+
+@receiver(post_save, sender=Ticket)
+def index_ticket(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index('ticket', instance)
+
+
+@receiver(post_save, sender=Review)
+def index_review(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index('review', instance)
+
+
+@receiver(post_delete, sender=Ticket)
+def unindex_ticket(sender, instance, **kwargs):
+    search.unindex('ticket', instance.id)
+
+
+@receiver(post_delete, sender=Review)
+def unindex_review(sender, instance, **kwargs):
+    search.unindex('review', instance.id)
+
+
+@receiver([post_save, post_delete], sender=Ticket)
+def invalidate_ticket_card(sender, instance, **kwargs):
+    cards.bump('ticket', instance.id)
+
+
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_review_card(sender, instance, **kwargs):
+    cards.bump('review', instance.id)
+
+
+@receiver(post_save, sender=Ticket)
+def queue_image_processing(sender, instance, raw=False, **kwargs):
+    """Hand a new or replaced ticket image over to the image worker"""
+    if raw or images.is_current(instance):
+        return
+    if instance.image:
+        jobs.enqueue(instance)
+    else:
+        images.refresh(instance)
+
+
+@receiver(post_save, sender=Ticket)
+def count_image_references(sender, instance, created, raw=False, **kwargs):
+    """Reference a ticket's new image and release the one it replaced"""
+    image = instance.image.name or ''
+    previous = '' if created else getattr(instance, '_loaded_image', image)
+    if not raw and image != previous:
+        media.acquire([image])
+        media.release([previous])
+    instance._loaded_image = image
+
+
+@receiver(post_delete, sender=Ticket)
+def release_image_files(sender, instance, **kwargs):
+    """Release a deleted ticket's image and renditions; unshared files are deleted"""
+    media.release(media.ticket_files(instance.image.name, instance.image_renditions))
+
+
+@receiver(post_delete, sender=ImageJob)
+def release_job_source(sender, instance, **kwargs):
+    """An active job deleted with its ticket no longer needs its upload"""
+    if instance.status in (ImageJob.PENDING, ImageJob.RUNNING):
+        media.release([instance.source])
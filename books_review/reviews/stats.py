@@ -0,0 +1,84 @@
+"""Incremental maintenance of the review statistics stored on Ticket.
+
+Every change is a single UPDATE with F() expressions, so concurrent reviews
+of the same ticket never overwrite each other's counts. recompute() rebuilds
+the statistics from the reviews to repair any drift.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Ticket, Review
+
+RATINGS = range(6)
+
+
+def review_added(ticket_id, rating):
+    rating = int(rating)
+    Ticket.objects.filter(pk=ticket_id).update(
+        review_count=F('review_count') + 1,
+        rating_sum=F('rating_sum') + rating,
+        **{f'rating_{rating}': F(f'rating_{rating}') + 1},
+    )
+
+
+def reviews_added(reviews):
+    """review_added for reviews created in bulk: one UPDATE per distinct set of ratings"""
+    ratings = defaultdict(Counter)
+    for review in reviews:
+        ratings[review.ticket_id][int(review.rating)] += 1
+    tickets_by_counts = defaultdict(list)
+    for ticket_id, counts in ratings.items():
+        tickets_by_counts[tuple(sorted(counts.items()))].append(ticket_id)
+    for counts, ticket_ids in tickets_by_counts.items():
+        Ticket.objects.filter(pk__in=ticket_ids).update(
+            review_count=F('review_count') + sum(count for _, count in counts),
+            rating_sum=F('rating_sum') + sum(rating * count for rating, count in counts),
+            **{f'rating_{rating}': F(f'rating_{rating}') + count for rating, count in counts},
+        )
+
+
+def review_removed(ticket_id, rating):
+    rating = int(rating)
+    Ticket.objects.filter(pk=ticket_id).update(
+        review_count=F('review_count') - 1,
+        rating_sum=F('rating_sum') - rating,
+        **{f'rating_{rating}': F(f'rating_{rating}') - 1},
+    )
+
+
+def rating_changed(ticket_id, old_rating, new_rating):
+    old_rating, new_rating = int(old_rating), int(new_rating)
+    if old_rating == new_rating:
+        return
+    Ticket.objects.filter(pk=ticket_id).update(
+        rating_sum=F('rating_sum') + (new_rating - old_rating),
+        **{
+            f'rating_{old_rating}': F(f'rating_{old_rating}') - 1,
+            f'rating_{new_rating}': F(f'rating_{new_rating}') + 1,
+        },
+    )
+
+
+def recompute(tickets=None):
+    """Rebuild the statistics of the given tickets (default: all) from their reviews.
+
+    Returns the number of tickets whose statistics were wrong.
+    """
+    if tickets is None:
+        tickets = Ticket.objects.all()
+    aggregates = {
+        'review_count': Count('id'),
+        'rating_sum': Coalesce(Sum('rating'), 0),
+        **{f'rating_{rating}': Count('id', filter=Q(rating=rating)) for rating in RATINGS},
+    }
+    fields = list(aggregates)
+
+    repaired = 0
+    for ticket in tickets.order_by('pk').only('pk', *fields).iterator(chunk_size=1000):
+        actual = Review.objects.filter(ticket=ticket).aggregate(**aggregates)
+        if any(getattr(ticket, field) != actual[field] for field in fields):
+            Ticket.objects.filter(pk=ticket.pk).update(**actual)
+            repaired += 1
+    return repaired
@@ -0,0 +1,73 @@
+"""Content-addressed file storage.
+
+A file is stored under the SHA-256 digest of its content, in the directory
+of the name it was saved with: ``ticket_images/cover.jpg`` becomes
+``ticket_images/3f/3f9a…c2.jpg``. Saving the same content twice returns the
+existing name without writing anything, and since a name never changes
+content, its URL can be cached forever. Deleting a file that other rows may
+still point to is the caller's business: see reviews.media, which save()
+tells about every file it returns (except in the image worker processes,
+which cannot reach the database).
+"""
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+from . import media
+
+DIGEST_NAME = re.compile(r'(^|/)([0-9a-f]{2})/\2[0-9a-f]{62}\.[a-z0-9]+$')
+
+
+def is_content_addressed(name):
+    return bool(DIGEST_NAME.search(name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    hash_chunk_size = 64 * 2 ** 10
+    # Turned off by images.init_worker_process
+    mark_saved = True
+
+    def digest(self, content):
+        sha256 = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(self.hash_chunk_size):
+            sha256.update(chunk)
+        content.seek(0)
+        return sha256.hexdigest()
+
+    def content_name(self, name, content):
+        directory, filename = posixpath.split(name)
+        if is_content_addressed(name):
+            # Re-saving a stored file: leave its shard directory
+            directory = posixpath.dirname(directory)
+        extension = posixpath.splitext(filename)[1].lower()
+        digest = self.digest(content)
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(self.generate_filename(name), content)
+        # Before the existence check, or the file could be collected between
+        # the check and the caller's reference
+        if self.mark_saved:
+            media.saved(name)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # Two saves racing for the same name hold the same content
+        return name
+
+    def _save(self, name, content):
+        # Write under a private name and move the file into place, so that a
+        # reader never sees it half-written
+        partial = super()._save(f'{name}.{uuid.uuid4().hex}.part', content)
+        os.replace(self.path(partial), self.path(name))
+        return name
@@ -0,0 +1,29 @@
+from django import template
+
+from ..images import WIDTHS, is_current, srcset
+
+register = template.Library()
+
+# Matches the max-w-xs (20rem) width of images in cards and forms
+SIZES = '(max-width: 20rem) 100vw, 20rem'
+
+
+@register.inclusion_tag('reviews/ticket_image.html')
+def ticket_image(ticket, css_class=''):
+    """Responsive <picture> for a ticket image, or a placeholder while it is being processed"""
+    if ticket.image and not is_current(ticket):
+        return {'ticket': ticket, 'css_class': css_class, 'processing': True}
+    renditions = ticket.image_renditions if ticket.image else {}
+    jpeg = renditions.get('jpeg', [])
+    # The smallest JPEG at least as wide as the card, for browsers without srcset
+    fallback = next((name for width, name in jpeg if width >= WIDTHS[1]), jpeg[-1][1] if jpeg else None)
+    return {
+        'ticket': ticket,
+        'css_class': css_class,
+        'src': ticket.image.storage.url(fallback) if fallback else (ticket.image.url if ticket.image else ''),
+        'webp_srcset': srcset(renditions, 'webp'),
+        'jpeg_srcset': srcset(renditions, 'jpeg'),
+        'sizes': SIZES,
+        'width': renditions.get('width'),
+        'height': renditions.get('height'),
+    }
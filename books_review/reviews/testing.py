@@ -0,0 +1,63 @@
+"""Test helpers shared by the apps' test suites"""
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TestCase as DjangoTestCase
+from django.test.utils import CaptureQueriesContext
+
+from authentication import ratelimit, usernames
+
+
+def clear_caches():
+    for cache in caches.all(initialized_only=True):
+        cache.clear()
+    # The login rate limits count the attempts of every test client
+    ratelimit.reset()
+    usernames.index.forget()
+
+
+class TestCase(DjangoTestCase):
+    """TestCase starting each class and each test with empty caches.
+
+    Primary keys are reused once a test's transaction is rolled back, so
+    values cached by one test would otherwise leak into the next.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        clear_caches()
+        super().setUpClass()
+
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+
+
+class QueryBudgetMixin:
+    """TestCase mixin asserting that a block stays within a fixed query budget.
+
+    Use it on pages whose query count must not depend on how many items they
+    render: run the block with a few items and with a full page, both must
+    fit in the same budget.
+    """
+
+    def assertQueryBudget(self, budget, using=DEFAULT_DB_ALIAS):
+        return _QueryBudgetContext(self, budget, connections[using])
+
+
+class _QueryBudgetContext(CaptureQueriesContext):
+    def __init__(self, test_case, budget, connection):
+        self.test_case = test_case
+        self.budget = budget
+        super().__init__(connection)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        queries = '\n'.join(
+            f'{index}. {query["sql"]}' for index, query in enumerate(self.captured_queries, start=1)
+        )
+        self.test_case.assertLessEqual(
+            len(self), self.budget,
+            f'{len(self)} queries executed, budget is {self.budget}:\n{queries}'
+        )
@@ -0,0 +1,138 @@
+"""Per-user timelines materialized on write.
+
+Each ticket or review is copied as a TimelineEntry into the timeline of its
+author, of the author's followers and, for a review, of the owner of the
+reviewed ticket. Reading a home feed page is then a single range scan on
+(owner, time_created, post_id, post_type).
+
+Deleting a post cascades to its entries through the foreign keys.
+"""
+from collections import defaultdict
+
+from django.db.models import Q
+
+from .feed import PAGE_SIZE, apaginate, decode_cursor, paginate
+from .follows import follower_ids
+from .models import Ticket, Review, TimelineEntry, UserFollows
+
+BATCH_SIZE = 1000
+
+
+def _entry(owner_id, post_type, post):
+    return TimelineEntry(
+        owner_id=owner_id,
+        author_id=post.user_id,
+        ticket=post if post_type == 'ticket' else None,
+        review=post if post_type == 'review' else None,
+        post_type=post_type,
+        post_id=post.id,
+        time_created=post.time_created,
+    )
+
+
+def _insert(entries):
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def audience(post_type, post, followers=None):
+    """Ids of the users whose timeline shows the post"""
+    owners = set(follower_ids(post.user_id) if followers is None else followers)
+    owners.add(post.user_id)
+    if post_type == 'review':
+        owners.add(post.ticket.user_id)
+    return owners
+
+
+def fan_out(post_type, post):
+    """Copy a newly created post into the timelines of its audience; return the audience"""
+    owners = audience(post_type, post)
+    _insert([_entry(owner_id, post_type, post) for owner_id in owners])
+    return owners
+
+
+def _insert_batched(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            _insert(batch)
+            batch = []
+    _insert(batch)
+
+
+def fan_out_many(post_type, posts):
+    """fan_out for posts created with bulk_create, which sends no signals"""
+    followers = defaultdict(list)
+    follows = UserFollows.objects.filter(followed_user_id__in={post.user_id for post in posts})
+    for followed_user_id, user_id in follows.values_list('followed_user_id', 'user_id'):
+        followers[followed_user_id].append(user_id)
+    _insert_batched(
+        _entry(owner_id, post_type, post)
+        for post in posts
+        for owner_id in audience(post_type, post, followers[post.user_id])
+    )
+
+
+def _posts_by(author_id):
+    """Every post of an author, as (post_type, post) pairs"""
+    for ticket in Ticket.objects.filter(user_id=author_id).order_by().iterator(chunk_size=BATCH_SIZE):
+        yield 'ticket', ticket
+    for review in Review.objects.filter(user_id=author_id).order_by().iterator(chunk_size=BATCH_SIZE):
+        yield 'review', review
+
+
+def _insert_posts(owner_id, posts):
+    _insert_batched(_entry(owner_id, post_type, post) for post_type, post in posts)
+
+
+def follow(user_id, followed_user_id):
+    """Backfill the posts of a newly followed user into the follower's timeline"""
+    _insert_posts(user_id, _posts_by(followed_user_id))
+
+
+def unfollow(user_id, followed_user_id):
+    """Remove an unfollowed user's posts, except reviews of the follower's own tickets"""
+    TimelineEntry.objects.filter(owner_id=user_id, author_id=followed_user_id).exclude(
+        review__ticket__user_id=user_id
+    ).delete()
+
+
+def rebuild(user):
+    """Recompute one user's timeline from scratch"""
+    TimelineEntry.objects.filter(owner=user).delete()
+    followed_ids = list(
+        UserFollows.objects.filter(user=user).values_list('followed_user_id', flat=True)
+    )
+    for author_id in [user.id, *followed_ids]:
+        _insert_posts(user.id, _posts_by(author_id))
+    replies = Review.objects.filter(ticket__user=user).order_by().iterator(chunk_size=BATCH_SIZE)
+    _insert_posts(user.id, (('review', review) for review in replies))
+
+
+def _after_cursor(cursor):
+    """Condition selecting the entries sorted after the cursor"""
+    time_created, post_type, post_id = cursor
+    return Q(time_created__lte=time_created) & (
+        Q(time_created__lt=time_created)
+        | Q(post_id__lt=post_id)
+        | Q(post_id=post_id, post_type__lt=post_type)
+    )
+
+
+def _timeline_keys(user, cursor):
+    entries = TimelineEntry.objects.filter(owner=user)
+    position = decode_cursor(cursor)
+    if position is not None:
+        entries = entries.filter(_after_cursor(position))
+    return entries.order_by('-time_created', '-post_id', '-post_type').values_list(
+        'time_created', 'post_type', 'post_id'
+    )
+
+
+def get_timeline_page(user, cursor=None, page_size=PAGE_SIZE):
+    """Return one page of a user's home timeline and the cursor of the next page"""
+    return paginate(_timeline_keys(user, cursor), page_size, viewer=user)
+
+
+async def aget_timeline_page(user, cursor=None, page_size=PAGE_SIZE):
+    return await apaginate(_timeline_keys(user, cursor), page_size, viewer=user)
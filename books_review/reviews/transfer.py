@@ -0,0 +1,254 @@
+"""Bulk transfer of tickets and reviews as JSON Lines.
+
+One record per line, each ticket before the reviews that refer to it::
+
+    {"type": "ticket", "id": 12, "user": "alice", "title": "Dune", "description": "", "time_created": "2024-05-01T10:00:00+00:00"}
+    {"type": "review", "id": 40, "ticket": 12, "user": "bob", "rating": 4, "headline": "Culte", "body": "", "time_created": "2024-05-02T08:30:00+00:00"}
+
+``id`` and ``ticket`` only link the records of one file: imported posts get
+new primary keys. Users are matched by username, and created without a
+usable password when they do not exist. Images are not transferred.
+
+``Importer`` inserts the posts with bulk_create, one transaction per batch.
+It keeps no records in memory, only two id maps: user ids by username and
+ticket ids by ticket key, about 120 bytes per imported ticket. bulk_create
+sends no signals, so each batch also does what the signals would:
+timelines, ticket statistics and search index.
+"""
+from collections import Counter
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from authentication import lookups
+from . import search, stats, timeline
+from .models import Ticket, Review
+
+BATCH_SIZE = 2000
+CHUNK_SIZE = 2000
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+@contextmanager
+def _keep_time_created(model):
+    """Let bulk_create store the imported time_created instead of now.
+
+    The field is shared by the whole process, which is why imports run in
+    management commands only.
+    """
+    field = model._meta.get_field('time_created')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _time_created(record):
+    value = record.get('time_created')
+    if value is None:
+        return timezone.now()
+    try:
+        # None when malformed, ValueError when well-formed but impossible
+        moment = parse_datetime(str(value))
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise InvalidRecord(f'invalid time_created {value!r}')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _key(record, field):
+    value = record.get(field)
+    if value is None:
+        raise InvalidRecord(f'missing {field}')
+    return str(value)
+
+
+def _username(record):
+    username = record.get('user')
+    if not username or not isinstance(username, str):
+        raise InvalidRecord('missing user')
+    return username
+
+
+def _validated(post, exclude):
+    try:
+        post.clean_fields(exclude=exclude)
+    except ValidationError as error:
+        raise InvalidRecord('; '.join(
+            f'{field}: {" ".join(messages)}' for field, messages in error.message_dict.items()
+        ))
+    return post
+
+
+class Importer:
+    """Imports the records fed to add(); call finish() after the last one"""
+
+    def __init__(self, batch_size=BATCH_SIZE, on_skip=None):
+        self.batch_size = batch_size
+        self.on_skip = on_skip
+        self.counts = Counter()
+        self._user_ids = {}
+        self._tickets = {}
+        self._pending_tickets = {}
+        self._pending_reviews = []
+
+    def add(self, line_number, record):
+        """Queue one decoded record; invalid records are skipped"""
+        try:
+            if not isinstance(record, dict):
+                raise InvalidRecord('not an object')
+            if record.get('type') == 'ticket':
+                self._add_ticket(line_number, record)
+            elif record.get('type') == 'review':
+                self._add_review(line_number, record)
+            else:
+                raise InvalidRecord(f'unknown type {record.get("type")!r}')
+        except InvalidRecord as error:
+            self.skip(line_number, str(error))
+
+    def skip(self, line_number, reason):
+        self.counts['skipped'] += 1
+        if self.on_skip:
+            self.on_skip(line_number, reason)
+
+    def finish(self):
+        self._flush_reviews()
+        return self.counts
+
+    def _add_ticket(self, line_number, record):
+        key = _key(record, 'id')
+        if key in self._tickets or key in self._pending_tickets:
+            raise InvalidRecord(f'duplicate ticket id {key}')
+        ticket = _validated(Ticket(
+            title=record.get('title') or '',
+            description=record.get('description') or '',
+            time_created=_time_created(record),
+        ), exclude=['user'])
+        self._pending_tickets[key] = (_username(record), ticket)
+        if len(self._pending_tickets) >= self.batch_size:
+            self._flush_tickets()
+
+    def _add_review(self, line_number, record):
+        key = _key(record, 'ticket')
+        if key not in self._tickets and key not in self._pending_tickets:
+            raise InvalidRecord(f'unknown ticket {key}')
+        try:
+            rating = int(record.get('rating'))
+        except (TypeError, ValueError):
+            raise InvalidRecord(f'invalid rating {record.get("rating")!r}')
+        review = _validated(Review(
+            rating=rating,
+            headline=record.get('headline') or '',
+            body=record.get('body') or '',
+            time_created=_time_created(record),
+        ), exclude=['user', 'ticket'])
+        self._pending_reviews.append((line_number, _username(record), key, review))
+        if len(self._pending_reviews) >= self.batch_size:
+            self._flush_reviews()
+
+    def _resolve_users(self, usernames):
+        User = get_user_model()
+        missing = set(usernames) - self._user_ids.keys()
+        if not missing:
+            return
+        self._user_ids.update(User.objects.filter(username__in=missing).values_list('username', 'id'))
+        missing -= self._user_ids.keys()
+        if missing:
+            users = User.objects.bulk_create(
+                [User(username=username, password=make_password(None)) for username in sorted(missing)]
+            )
+            self._user_ids.update((user.username, user.id) for user in users)
+            self.counts['users'] += len(users)
+            # bulk_create sends no post_save: drop the cached misses by hand
+            lookups.forget(*missing)
+
+    def _flush_tickets(self):
+        if not self._pending_tickets:
+            return
+        pending, self._pending_tickets = self._pending_tickets, {}
+        with _keep_time_created(Ticket), transaction.atomic():
+            self._resolve_users(username for username, _ in pending.values())
+            tickets = []
+            for username, ticket in pending.values():
+                ticket.user_id = self._user_ids[username]
+                tickets.append(ticket)
+            Ticket.objects.bulk_create(tickets)
+            timeline.fan_out_many('ticket', tickets)
+            search.index_many('ticket', tickets)
+        for key, (_, ticket) in pending.items():
+            self._tickets[key] = ticket.id
+        self.counts['tickets'] += len(tickets)
+
+    def _flush_reviews(self):
+        # Reviews may refer to tickets of the pending batch
+        self._flush_tickets()
+        if not self._pending_reviews:
+            return
+        pending, self._pending_reviews = self._pending_reviews, []
+        with _keep_time_created(Review), transaction.atomic():
+            self._resolve_users(username for _, username, _, _ in pending)
+            ticket_ids = {key: self._tickets[key] for _, _, key, _ in pending}
+            owners = dict(Ticket.objects.filter(id__in=ticket_ids.values()).values_list('id', 'user_id'))
+            for _, username, key, review in pending:
+                review.user_id = self._user_ids[username]
+                # Only the owner is needed, to fan the review out
+                review.ticket = Ticket(id=ticket_ids[key], user_id=owners[ticket_ids[key]])
+            reviews = self._insert_reviews(pending)
+            stats.reviews_added(reviews)
+            timeline.fan_out_many('review', reviews)
+            search.index_many('review', reviews)
+        self.counts['reviews'] += len(reviews)
+
+    def _insert_reviews(self, pending):
+        reviews = [review for _, _, _, review in pending]
+        try:
+            with transaction.atomic():
+                return Review.objects.bulk_create(reviews)
+        except IntegrityError:
+            pass
+        # A user reviewed the same ticket twice: insert one by one to skip
+        # the duplicates only
+        inserted = []
+        for line_number, _, _, review in pending:
+            try:
+                with transaction.atomic():
+                    Review.objects.bulk_create([review])
+            except IntegrityError:
+                self.skip(line_number, 'duplicate review of the ticket by the same user')
+            else:
+                inserted.append(review)
+        return inserted
+
+
+def export_records(chunk_size=CHUNK_SIZE):
+    """Every ticket, then every review, as records for Importer"""
+    tickets = Ticket.objects.order_by('id').values_list(
+        'id', 'user__username', 'title', 'description', 'time_created'
+    )
+    for ticket_id, username, title, description, time_created in tickets.iterator(chunk_size=chunk_size):
+        yield {
+            'type': 'ticket', 'id': ticket_id, 'user': username, 'title': title,
+            'description': description, 'time_created': time_created.isoformat(),
+        }
+    reviews = Review.objects.order_by('id').values_list(
+        'id', 'ticket_id', 'user__username', 'rating', 'headline', 'body', 'time_created'
+    )
+    for review_id, ticket_id, username, rating, headline, body, time_created in reviews.iterator(
+        chunk_size=chunk_size
+    ):
+        yield {
+            'type': 'review', 'id': review_id, 'ticket': ticket_id, 'user': username, 'rating': rating,
+            'headline': headline, 'body': body, 'time_created': time_created.isoformat(),
+        }
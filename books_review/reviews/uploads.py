@@ -0,0 +1,103 @@
+"""Streaming upload handling for ticket images.
+
+Views decorated with ``image_uploads`` parse their uploads with
+ImageUploadHandler only: every file goes to a temporary file on disk in
+``chunk_size`` pieces, whatever its size, so a request holds at most one
+chunk of it in memory. The first bytes are checked against the signatures
+of the accepted image formats, and a file that is not an image or that
+grows past ``IMAGE_UPLOAD_MAX_SIZE`` stops being written at once. It reaches
+the form as a RejectedUpload carrying the reason, which ImageUploadField
+reports as a field error.
+"""
+from functools import wraps
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+HEADER_SIZE = 12
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+    (b'BM', 'BMP'),
+    (b'II*\x00', 'TIFF'),
+    (b'MM\x00*', 'TIFF'),
+]
+
+
+def image_format(header):
+    """Image format announced by the first HEADER_SIZE bytes of a file, or None"""
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    for signature, name in SIGNATURES:
+        if header.startswith(signature):
+            return name
+    return None
+
+
+class RejectedUpload(UploadedFile):
+    """Stands in for a file the upload handler refused"""
+
+    def __init__(self, name, content_type, reason):
+        super().__init__(BytesIO(), name, content_type, 0)
+        self.upload_error = reason
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    chunk_size = 64 * 2 ** 10
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size or settings.IMAGE_UPLOAD_MAX_SIZE
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.header = b''
+        self.received = 0
+        self.rejection = None
+
+    def reject(self, reason):
+        self.rejection = reason
+        # Drop what was written so far; the rest of the file is not stored
+        self.upload_interrupted()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.rejection:
+            return None
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.reject(f'Le fichier dépasse la taille maximale de {self.max_size // 2 ** 20} Mo.')
+            return None
+        if len(self.header) < HEADER_SIZE:
+            self.header += raw_data[:HEADER_SIZE - len(self.header)]
+            if len(self.header) == HEADER_SIZE and not image_format(self.header):
+                self.reject('Ce fichier n\'est pas une image (JPEG, PNG, GIF, WebP, BMP ou TIFF).')
+                return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if not self.rejection and not image_format(self.header):
+            self.reject('Ce fichier n\'est pas une image (JPEG, PNG, GIF, WebP, BMP ou TIFF).')
+        if self.rejection:
+            return RejectedUpload(self.file_name, self.content_type, self.rejection)
+        return super().file_complete(file_size)
+
+
+def image_uploads(view):
+    """Parse the view's uploads with ImageUploadHandler.
+
+    Upload handlers must be set before anything reads request.POST, which
+    the CSRF middleware does: the check is moved inside the view, after the
+    handlers are installed.
+    """
+    protected = csrf_protect(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return csrf_exempt(wrapper)
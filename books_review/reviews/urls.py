@@ -5,6 +5,14 @@ app_name = 'reviews'
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('feed/events/', views.feed_events, name='feed_events'),
+    path('feed/<str:post_type>/<int:post_id>/card/', views.feed_card, name='feed_card'),
+    path('search/', views.search, name='search'),
+    path('stats/cards/', views.card_cache_stats, name='card_cache_stats'),
+    path('stats/database/', views.database_stats, name='database_stats'),
+    path('stats/requests/', views.request_stats, name='request_stats'),
+    path('stats/rate-limits/', views.rate_limit_stats, name='rate_limit_stats'),
+    path('metrics/', views.metrics, name='metrics'),
     
     # Ticket URLs
     path('tickets/create/', views.create_ticket, name='create_ticket'),
@@ -1,42 +1,128 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views import static
+from authentication import ratelimit
+from authentication.lookups import aload_user
+from books_review import instrumentation, replicas
+from books_review.rendering import arender
+from . import cards, events
+from .feed import ahydrate
 from .forms import TicketForm, ReviewForm, TicketReviewForm
-from .models import Ticket, Review
+from .models import Ticket, Review, TimelineEntry
+from .search import MAX_PAGE, search_posts
+from .storage import is_content_addressed
+from .timeline import aget_timeline_page
+from .uploads import image_uploads
 
 
 @login_required
-def home(request):
-    """Home page showing all tickets and reviews"""
-    # Get all tickets and reviews
-    tickets = Ticket.objects.all()
-    reviews = Review.objects.all()
-    
-    # Create a combined list of tickets and reviews for the feed
-    feed_items = []
-    
-    for ticket in tickets:
-        feed_items.append({
-            'type': 'ticket',
-            'object': ticket,
-            'time_created': ticket.time_created
-        })
-    
-    for review in reviews:
-        feed_items.append({
-            'type': 'review',
-            'object': review,
-            'time_created': review.time_created
-        })
-    
-    # Sort by creation time (newest first)
-    feed_items.sort(key=lambda x: x['time_created'], reverse=True)
-    
-    return render(request, 'reviews/home.html', {'feed_items': feed_items})
+@replicas.replica_reads
+async def home(request):
+    """Home page showing the user's timeline, one page at a time"""
+    user = await aload_user(request)
+    feed_items, next_cursor = await aget_timeline_page(user, cursor=request.GET.get('cursor'))
+    await cards.arender_bodies(feed_items)
+
+    return await arender(request, 'reviews/home.html', {
+        'feed_items': feed_items,
+        'next_cursor': next_cursor,
+        'events_token': events.token_for(user.id, request.session.session_key),
+    })
+
+
+async def feed_events(request):
+    """Stream the new posts of a user's timeline as Server-Sent Events.
+
+    books_review.asgi serves this URL with events.asgi_app; the view is used
+    when Django handles it itself.
+    """
+    user_id = await events.auser_for_token(request.GET.get('token', ''))
+    if user_id is None:
+        return HttpResponseForbidden()
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server would hold a thread per connection: 204 tells
+        # EventSource to stop reconnecting
+        return HttpResponse(status=204)
+    return StreamingHttpResponse(events.stream(user_id), content_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+@login_required
+async def feed_card(request, post_type, post_id):
+    """One card of the user's timeline, fetched for the posts pushed by feed_events"""
+    user = await aload_user(request)
+    if not await TimelineEntry.objects.filter(owner=user, post_type=post_type, post_id=post_id).aexists():
+        raise Http404
+    items = await ahydrate([(None, post_type, post_id)], viewer=user)
+    if not items:
+        raise Http404
+    await cards.arender_bodies(items)
+    return await arender(request, 'reviews/feed_item.html', {'item': items[0]})
+
+
+@login_required
+def search(request):
+    """Search tickets and reviews, best matches first"""
+    query = request.GET.get('q', '').strip()
+    try:
+        page = min(max(int(request.GET.get('page', 1)), 1), MAX_PAGE)
+    except ValueError:
+        page = 1
+
+    results, has_next = search_posts(query, page, viewer=request.user)
+
+    return render(request, 'reviews/search.html', {
+        'query': query,
+        'results': results,
+        'page': page,
+        'has_next': has_next,
+    })
+
+
+@staff_member_required
+def card_cache_stats(request):
+    """Hit/miss counters of the feed card fragment cache"""
+    return JsonResponse(cards.stats())
+
+
+@staff_member_required
+def database_stats(request):
+    """Queries executed per database alias, primary and replicas"""
+    return JsonResponse({'replicas': settings.DATABASE_REPLICAS, 'queries': replicas.query_counts()})
+
+
+@staff_member_required
+def rate_limit_stats(request):
+    """Login and registration attempts allowed and rejected by the rate limits"""
+    return JsonResponse(ratelimit.stats())
+
+
+@staff_member_required
+def request_stats(request):
+    """Timings, queries and cache hits of the sampled requests, per view"""
+    return JsonResponse(instrumentation.snapshot())
+
+
+def metrics(request):
+    """Request metrics in the Prometheus text format, for staff or a scraper sending METRICS_TOKEN"""
+    token = settings.METRICS_TOKEN
+    scraper = token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not scraper and not (request.user.is_active and request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(instrumentation.prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 # Ticket CRUD Views
 @login_required
+@image_uploads
 def create_ticket(request):
     """Create a new ticket"""
     if request.method == 'POST':
@@ -54,6 +140,7 @@ def create_ticket(request):
 
 
 @login_required
+@image_uploads
 def edit_ticket(request, ticket_id):
     """Edit an existing ticket"""
     ticket = get_object_or_404(Ticket, id=ticket_id)
@@ -107,8 +194,7 @@ def create_review(request, ticket_id):
     ticket = get_object_or_404(Ticket, id=ticket_id)
     
     # Check if user already reviewed this ticket
-    existing_review = Review.objects.filter(ticket=ticket, user=request.user).first()
-    if existing_review:
+    if Review.objects.filter(ticket=ticket, user=request.user).exists():
         messages.warning(request, 'Vous avez déjà écrit une critique pour ce ticket.')
         return redirect('reviews:home')
     
@@ -132,6 +218,7 @@ def create_review(request, ticket_id):
 
 
 @login_required
+@image_uploads
 def create_standalone_review(request):
     """Create a review with its own ticket (standalone review)"""
     if request.method == 'POST':
@@ -166,6 +253,7 @@ def create_standalone_review(request):
 
 
 @login_required
+@image_uploads
 def edit_review(request, review_id):
     """Edit an existing review"""
     review = get_object_or_404(Review, id=review_id)
@@ -246,3 +334,11 @@ def delete_review(request, review_id):
         'object': review,
         'object_type': 'critique'
     })
+
+
+def media(request, path):
+    """Serve an uploaded file during development; content-addressed files never change"""
+    response = static.serve(request, path, document_root=settings.MEDIA_ROOT)
+    if is_content_addressed(path):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response